@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+
+"""
+Adaptive question selector
+اختيار السؤال التالي حسب نقاط ضعف المستخدم (المواضيع الضعيفة، الأسئلة الصعبة، الأخطاء السابقة)
+
+Each cached user has:
+
+- their per-topic (correct, attempts) from user_topics, which weights the
+  choice of topic when none is selected (weaker topic = more likely);
+- a review heap of questions they missed (user_mistakes) or rated hard
+  (hard_questions), ordered by
+  missed * MISSED_WEIGHT + hard * HARD_WEIGHT + topic weakness * WEAK_TOPIC_WEIGHT.
+
+About REVIEW_SHARE of the picks come from the top of the review heap; the
+rest are unanswered questions (question_sampler.sample_unanswered) from
+the chosen topic. After each answer only the answered question's heap entry is
+pushed again (O(log n)); stale entries are skipped lazily when popped.
+
+Users are kept in an LRU cache and loaded on a miss with three
+single-table indexed reads, so a pick never runs a multi-table query.
+Wrong MCQ answers are not stored in the database; they count as missed
+only while the user stays cached.
+"""
+
+import heapq
+import random
+import threading
+from collections import OrderedDict
+
+from question_bank import DEFAULT_SUBJECT, DEFAULT_TOPIC
+from question_sampler import sample_unanswered
+
+# نسبة الأسئلة التي تأتي من قائمة المراجعة
+REVIEW_SHARE = 0.3
+MISSED_WEIGHT = 2.0
+HARD_WEIGHT = 3.0
+WEAK_TOPIC_WEIGHT = 1.0
+
+
+class UserPriorities:
+    """Topic accuracy and the review heap of one user"""
+
+    __slots__ = ('topics', 'missed', 'hard', 'priority', 'heap', 'last_question')
+
+    def __init__(self):
+        self.topics = {}
+        self.missed = {}
+        self.hard = set()
+        self.priority = {}
+        self.heap = []
+        self.last_question = None
+
+    def weakness(self, topic):
+        correct, attempts = self.topics.get(topic, (0, 0))
+        return 1 - (correct + 1) / (attempts + 2)
+
+    def push(self, q_id, topic):
+        """(Re)compute the review priority of one question: O(log n)"""
+        missed = self.missed.get(q_id, 0)
+        hard = q_id in self.hard
+        if not missed and not hard:
+            self.priority.pop(q_id, None)
+            return
+        priority = missed * MISSED_WEIGHT + hard * HARD_WEIGHT + self.weakness(topic) * WEAK_TOPIC_WEIGHT
+        self.priority[q_id] = priority
+        heapq.heappush(self.heap, (-priority, q_id))
+        # إزالة المدخلات القديمة عندما تكثر
+        if len(self.heap) > 2 * len(self.priority) + 16:
+            self.heap = [(-p, q) for q, p in self.priority.items()]
+            heapq.heapify(self.heap)
+
+    def best_review(self, accept):
+        """Highest priority question accepted by `accept`, or None"""
+        heap = self.heap
+        while heap and self.priority.get(heap[0][1]) != -heap[0][0]:
+            heapq.heappop(heap)
+        if heap and accept(heap[0][1]):
+            return heap[0][1]
+        # القمة لا تطابق المادة/الموضوع المختار: بحث خطي في قائمة المراجعة (صغيرة)
+        best = None
+        for negative, q_id in heap:
+            if self.priority.get(q_id) == -negative and accept(q_id) and (best is None or negative < best[0]):
+                best = (negative, q_id)
+        return best and best[1]
+
+
+class AdaptiveSelector:
+    """Per-user UserPriorities (LRU) and the pick between review and new questions"""
+
+    def __init__(self, max_users=10000, review_share=REVIEW_SHARE, rng=random):
+        self.max_users = max_users
+        self.review_share = review_share
+        self.rng = rng
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def priorities(self, chat_id, bank, conn):
+        with self._lock:
+            user = self._users.get(chat_id)
+            if user is not None:
+                self._users.move_to_end(chat_id)
+                return user
+
+        user = self._load(chat_id, bank, conn)
+
+        with self._lock:
+            user = self._users.setdefault(chat_id, user)
+            self._users.move_to_end(chat_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        return user
+
+    def _load(self, chat_id, bank, conn):
+        user = UserPriorities()
+        for topic, correct, attempts in conn.execute(
+            'SELECT topic, correct, attempts FROM user_topics WHERE chat_id = ?', (chat_id,)
+        ).fetchall():
+            user.topics[topic] = (correct or 0, attempts or 0)
+        for q_id, count in conn.execute(
+            'SELECT question_id, count FROM user_mistakes WHERE chat_id = ?', (chat_id,)
+        ).fetchall():
+            user.missed[q_id] = user.missed.get(q_id, 0) + (count or 1)
+        user.hard.update(q_id for (q_id,) in conn.execute(
+            'SELECT question_id FROM hard_questions WHERE chat_id = ?', (chat_id,)
+        ).fetchall())
+        for q_id in set(user.missed) | user.hard:
+            q = bank.get(q_id)
+            if q is not None:
+                user.push(q_id, q.get('topic', DEFAULT_TOPIC))
+        return user
+
+    def pick(self, conn, chat_id, bank, answered, subject=None, topic=None, prefer=None):
+        """Return the next question (a review or a new one), or None if the pool is exhausted"""
+        user = self.priorities(chat_id, bank, conn)
+        with self._lock:
+            q = None
+            if user.priority and self.rng.random() < self.review_share:
+                q = self._review(user, bank, subject, topic)
+            if q is None:
+                q = self._new_question(user, bank, answered, subject, topic, prefer)
+            if q is not None:
+                user.last_question = q['id']
+            return q
+
+    def _review(self, user, bank, subject, topic):
+        def accept(q_id):
+            q = bank.get(q_id)
+            return (q is not None and q_id != user.last_question
+                    and (subject is None or q.get('subject', DEFAULT_SUBJECT) == subject)
+                    and (topic is None or q.get('topic', DEFAULT_TOPIC) == topic))
+
+        q_id = user.best_review(accept)
+        return bank.get(q_id) if q_id is not None else None
+
+    def _new_question(self, user, bank, answered, subject, topic, prefer):
+        if topic is None:
+            # اختيار موضوع بوزن ضعف المستخدم فيه
+            topics = list(dict.fromkeys(t for (s, t) in bank.by_subject_topic if subject is None or s == subject))
+            if len(topics) > 1:
+                chosen = self.rng.choices(topics, [user.weakness(t) for t in topics])[0]
+                ordinal = sample_unanswered(bank.pool(subject, chosen), answered, self.rng, prefer=prefer)
+                if ordinal is not None:
+                    return bank.by_ordinal[ordinal]
+        ordinal = sample_unanswered(bank.pool(subject, topic), answered, self.rng, prefer=prefer)
+        return None if ordinal is None else bank.by_ordinal[ordinal]
+
+    def record_answer(self, chat_id, q, is_correct):
+        """Update the cached user (if any) after an answer"""
+        with self._lock:
+            user = self._users.get(chat_id)
+            if user is None:
+                return
+            topic = q.get('topic', DEFAULT_TOPIC)
+            correct, attempts = user.topics.get(topic, (0, 0))
+            user.topics[topic] = (correct + bool(is_correct), attempts + 1)
+            if is_correct:
+                missed = user.missed.pop(q['id'], 0)
+                if missed > 1:
+                    user.missed[q['id']] = missed - 1
+                user.hard.discard(q['id'])
+            else:
+                user.missed[q['id']] = user.missed.get(q['id'], 0) + 1
+            user.push(q['id'], topic)
+
+    def mark_hard(self, chat_id, q):
+        with self._lock:
+            user = self._users.get(chat_id)
+            if user is not None:
+                user.hard.add(q['id'])
+                user.push(q['id'], q.get('topic', DEFAULT_TOPIC))
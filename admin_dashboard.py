@@ -1,6 +1,5 @@
 # -*- coding: utf-8 -*-
 from flask import Flask, render_template, request, jsonify
-import sqlite3
 from datetime import datetime, timedelta
 import matplotlib.pyplot as plt
 from io import BytesIO
@@ -11,6 +10,7 @@ from flask_httpauth import HTTPBasicAuth
 import telebot
 import os
 from dotenv import load_dotenv
+from db import DATABASE, get_connection
 
 matplotlib.use('Agg')  # هذا السطر مهم لتجنب مشاكل الخيوط
 
@@ -20,9 +20,6 @@ load_dotenv()
 # تهيئة Flask
 app = Flask(__name__)
 
-# تكوين قاعدة البيانات
-DATABASE = 'science_bot.db'
-
 # تهيئة نظام المصادقة
 auth = HTTPBasicAuth()
 
@@ -39,9 +36,8 @@ def verify_password(username, password):
     return username == ADMIN_USERNAME and password == ADMIN_PASSWORD
 
 def get_db_connection():
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row
-    return conn
+    # اتصال دائم لكل خيط (انظر db.py)
+    return get_connection(DATABASE)
 
 def generate_plot(data, x, y, title, xlabel, ylabel, plot_type='bar', figsize=(10, 5)):
     plt.figure(figsize=figsize)
@@ -72,20 +68,20 @@ def generate_plot(data, x, y, title, xlabel, ylabel, plot_type='bar', figsize=(1
 def dashboard():
     conn = get_db_connection()
     
-    # إحصائيات المستخدمين
-    total_users = conn.execute('SELECT COUNT(*) FROM users').fetchone()[0]
+    # إحصائيات المستخدمين (من جداول التجميع stats_*)
+    total_users = conn.execute('SELECT COALESCE(SUM(users), 0) FROM stats_totals').fetchone()[0]
     active_today = conn.execute("""
-        SELECT COUNT(*) FROM users 
-        WHERE date(last_active) = date('now')
+        SELECT COALESCE(SUM(active_users), 0) FROM stats_daily 
+        WHERE day = date('now')
     """).fetchone()[0]
     new_today = conn.execute("""
-        SELECT COUNT(*) FROM users 
-        WHERE date(register_date) = date('now')
+        SELECT COALESCE(SUM(new_users), 0) FROM stats_daily 
+        WHERE day = date('now')
     """).fetchone()[0]
     
     # إحصائيات النشاط
     total_questions_answered = conn.execute("""
-        SELECT SUM(questions_answered) FROM user_sessions
+        SELECT SUM(questions_answered) FROM stats_monthly
     """).fetchone()[0] or 0
     
     avg_questions_per_user = round(total_questions_answered / total_users, 1) if total_users > 0 else 0
@@ -97,8 +93,8 @@ def dashboard():
     """).fetchone()[0]
     
     avg_session_duration = conn.execute("""
-        SELECT AVG((julianday(end_time) - julianday(start_time)) * 24 * 60 
-        FROM user_sessions WHERE end_time IS NOT NULL
+        SELECT SUM(session_minutes) / SUM(finished_sessions) 
+        FROM stats_monthly WHERE finished_sessions > 0
     """).fetchone()[0] or 0
     
     # الملاحظات الحديثة
@@ -110,48 +106,43 @@ def dashboard():
     
     # الأخطاء الشائعة
     common_errors = conn.execute("""
-        SELECT question_id, wrong_answer, count 
-        FROM error_analysis 
+        SELECT question_id, representative AS wrong_answer, count 
+        FROM error_clusters 
         ORDER BY count DESC LIMIT 5
     """).fetchall()
     
     # نمو المستخدمين (آخر 7 أيام)
     user_growth = conn.execute("""
-        SELECT date(register_date) as day, COUNT(*) as count 
-        FROM users 
-        WHERE date(register_date) >= date('now', '-7 days')
-        GROUP BY day 
+        SELECT day, new_users as count 
+        FROM stats_daily 
+        WHERE day >= date('now', '-7 days') AND new_users > 0
         ORDER BY day
     """).fetchall()
     
     # نشاط المستخدمين (آخر 7 أيام)
     user_activity = conn.execute("""
-        SELECT date(last_active) as day, COUNT(*) as count 
-        FROM users 
-        WHERE date(last_active) >= date('now', '-7 days')
-        GROUP BY day 
+        SELECT day, active_users as count 
+        FROM stats_daily 
+        WHERE day >= date('now', '-7 days') AND active_users > 0
         ORDER BY day
     """).fetchall()
     
     # توزيع المواضيع
     topic_distribution = conn.execute("""
-        SELECT selected_topic as topic, COUNT(*) as count 
-        FROM users 
-        WHERE selected_topic IS NOT NULL
-        GROUP BY selected_topic 
-        ORDER BY count DESC LIMIT 5
+        SELECT topic, users as count 
+        FROM stats_topics 
+        WHERE users > 0
+        ORDER BY users DESC LIMIT 5
     """).fetchall()
     
     # جلسات المستخدمين حسب الوقت
     session_hours = conn.execute("""
-        SELECT strftime('%H', start_time) as hour, COUNT(*) as count
-        FROM user_sessions
-        GROUP BY hour
+        SELECT hour, sessions as count
+        FROM stats_hourly
+        WHERE sessions > 0
         ORDER BY hour
     """).fetchall()
     
-    conn.close()
-    
     # تحضير البيانات للرسوم البيانية
     growth_df = pd.DataFrame(user_growth, columns=['day', 'count'])
     activity_df = pd.DataFrame(user_activity, columns=['day', 'count'])
@@ -224,10 +215,9 @@ def view_feedback():
             SUM(CASE WHEN rating = 3 THEN 1 ELSE 0 END) as average,
             SUM(CASE WHEN rating = 2 THEN 1 ELSE 0 END) as poor,
             SUM(CASE WHEN rating = 1 THEN 1 ELSE 0 END) as bad
-        FROM user_feedback
+        FROM user_feedback  -- full-scan: إحصائية لكل الملاحظات
     """).fetchone()
     
-    conn.close()
     return render_template('feedback.html', 
                          feedbacks=feedbacks,
                          feedback_stats=feedback_stats,
@@ -259,15 +249,15 @@ def view_users():
     # إحصائيات المستخدمين
     user_stats = conn.execute("""
         SELECT 
-            COUNT(*) as total,
-            AVG(score) as avg_score,
-            AVG(attempts) as avg_attempts,
-            SUM(CASE WHEN date(last_active) = date('now') THEN 1 ELSE 0 END) as active_today,
-            SUM(CASE WHEN date(register_date) = date('now') THEN 1 ELSE 0 END) as new_today
-        FROM users
+            stats_totals.users as total,
+            CASE WHEN stats_totals.users > 0 THEN 1.0 * stats_totals.score / stats_totals.users END as avg_score,
+            CASE WHEN stats_totals.users > 0 THEN 1.0 * stats_totals.attempts / stats_totals.users END as avg_attempts,
+            COALESCE(stats_daily.active_users, 0) as active_today,
+            COALESCE(stats_daily.new_users, 0) as new_today
+        FROM stats_totals
+        LEFT JOIN stats_daily ON stats_daily.day = date('now')
     """).fetchone()
     
-    conn.close()
     return render_template('users.html', 
                          users=users,
                          user_stats=user_stats)
@@ -284,11 +274,10 @@ def view_questions():
             q.question,
             q.topic,
             q.difficulty,
-            COUNT(DISTINCT ua.chat_id) as users_answered,
+            q.answered_users as users_answered,
             COUNT(DISTINCT um.chat_id) as users_mistakes,
             (SELECT COUNT(*) FROM error_analysis WHERE question_id = q.id) as total_errors
-        FROM questions q
-        LEFT JOIN user_answered ua ON q.id = ua.question_id
+        FROM questions q  -- full-scan: جدول الأسئلة صغير (بحجم بنك الأسئلة)
         LEFT JOIN user_mistakes um ON q.id = um.question_id
         GROUP BY q.id
         ORDER BY total_errors DESC
@@ -302,10 +291,9 @@ def view_questions():
             AVG(difficulty) as avg_difficulty,
             COUNT(DISTINCT topic) as topics_count,
             (SELECT COUNT(*) FROM error_analysis) as total_errors
-        FROM questions
+        FROM questions  -- full-scan: جدول الأسئلة صغير (بحجم بنك الأسئلة)
     """).fetchone()
     
-    conn.close()
     return render_template('questions.html',
                          questions=questions,
                          question_stats=question_stats)
@@ -324,7 +312,9 @@ def send_notification():
     
     # إرسال لجميع المستخدمين إذا لم يتم تحديد مستخدمين معينين
     if not user_ids:
-        users = conn.execute('SELECT chat_id FROM users').fetchall()
+        users = conn.execute('''
+            SELECT chat_id FROM users  -- full-scan: الرسالة لكل المستخدمين
+        ''').fetchall()
         user_ids = [user['chat_id'] for user in users]
     
     success_count = 0
@@ -335,7 +325,6 @@ def send_notification():
         except Exception as e:
             print(f"Failed to send to {user_id}: {e}")
     
-    conn.close()
     return jsonify({
         'status': 'success',
         'message': f'تم إرسال الإشعار إلى {success_count}/{len(user_ids)} مستخدم'
@@ -351,7 +340,6 @@ def users_list():
         ORDER BY last_active DESC 
         LIMIT 100
     """).fetchall()
-    conn.close()
     return jsonify({
         'users': [dict(user) for user in users]
     })
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+"""
+Answered questions bitmap
+الأسئلة المجابة لكل مستخدم كصف واحد (bitmap بترتيب الأسئلة) بدلاً من صف لكل سؤال
+
+Bit `n` of user_answered_bits.bits is set when the question with ordinal
+`n` is answered. Ordinals are persisted with the questions table and never
+reused (see question_sync.load_ordinals), so one bitmap per user stays
+valid across bank versions and restarts.
+"""
+
+from question_sampler import AnsweredSet
+
+# عدد المستخدمين في كل دفعة عند تحويل صفوف user_answered القديمة
+CONVERT_BATCH = 500
+
+
+def load_answered_bits(conn, chat_id):
+    row = conn.execute('SELECT bits FROM user_answered_bits WHERE chat_id = ?', (chat_id,)).fetchone()
+    return bytes(row[0]) if row else b''
+
+
+def mark_answered(conn, chat_id, question_id, ordinal):
+    """Set one bit (read-modify-write of one row; runs on the writer thread)"""
+    answered = AnsweredSet(load_answered_bits(conn, chat_id))
+    if ordinal in answered:
+        return False
+    answered.add(ordinal)
+    conn.execute('''
+    INSERT INTO user_answered_bits (chat_id, bits) VALUES (?, ?)
+    ON CONFLICT(chat_id) DO UPDATE SET bits = excluded.bits''', (chat_id, answered.to_bytes()))
+    conn.execute('UPDATE questions SET answered_users = answered_users + 1 WHERE id = ?', (question_id,))
+    return True
+
+
+def clear_answered(conn, chat_id):
+    """Reset the user's bitmap and take the user out of answered_users of every question in it"""
+    row = conn.execute('DELETE FROM user_answered_bits WHERE chat_id = ? RETURNING bits', (chat_id,)).fetchone()
+    if row is None:
+        return
+    conn.executemany('''
+    UPDATE questions SET answered_users = answered_users - 1
+    WHERE ordinal = ? AND answered_users > 0''', [(ordinal,) for ordinal in AnsweredSet(row[0])])
+
+
+def convert_user_answered(conn, ordinals, batch=CONVERT_BATCH):
+    """Move up to `batch` users from user_answered rows into bitmaps; returns the number moved.
+
+    Rows of questions that are no longer in the bank are dropped. Bits
+    already in a user's bitmap are kept. Call repeatedly until it returns 0.
+    """
+    chat_ids = [row[0] for row in conn.execute(
+        'SELECT DISTINCT chat_id FROM user_answered LIMIT ?', (batch,)
+    ).fetchall()]
+    for chat_id in chat_ids:
+        answered = AnsweredSet(load_answered_bits(conn, chat_id))
+        for (question_id,) in conn.execute(
+            'SELECT question_id FROM user_answered WHERE chat_id = ?', (chat_id,)
+        ).fetchall():
+            ordinal = ordinals.get(question_id)
+            if ordinal is not None and ordinal not in answered:
+                answered.add(ordinal)
+                conn.execute('UPDATE questions SET answered_users = answered_users + 1 WHERE id = ?',
+                             (question_id,))
+        conn.execute('''
+        INSERT INTO user_answered_bits (chat_id, bits) VALUES (?, ?)
+        ON CONFLICT(chat_id) DO UPDATE SET bits = excluded.bits''', (chat_id, answered.to_bytes()))
+        conn.execute('DELETE FROM user_answered WHERE chat_id = ?', (chat_id,))
+    return len(chat_ids)
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+
+"""
+Answer recording
+تسجيل الإجابة (النقاط، المواضيع، الأخطاء، الأسئلة المجابة، آخر نشاط) في معاملة واحدة
+"""
+
+from datetime import datetime
+
+from answered_bits import mark_answered
+from calibration import ability, record_outcome
+from db_writer import get_writer
+from error_clusters import add_wrong_answer
+from spaced_repetition import review_quality, schedule_hard, update_review
+
+
+def record_answer(chat_id, question_id, topic, is_correct, user_answer=None, accuracy=0,
+                  with_feedback=False, ordinal=None):
+    """Record one answer in a single transaction on the writer thread.
+
+    Updates users (score, attempts, last_active), user_topics,
+    question_calibration, hard_questions (a correct answer clears it),
+    review_schedule, error_analysis, error_clusters and user_mistakes
+    (only for a wrong text answer, i.e. when `user_answer` is given) and
+    the user's answered bitmap (when the question's `ordinal` is given).
+    With `with_feedback` it also reads, inside the same transaction, what
+    generate_feedback needs. Returns a dict with 'common_errors', 'topic_stats' and
+    'user_mistake' (empty unless `with_feedback`).
+    """
+    correct = 1 if is_correct else 0
+    now = datetime.now().isoformat()
+    return get_writer().call(_record_answer, chat_id, question_id, topic, correct, now,
+                             user_answer, accuracy, with_feedback, ordinal)
+
+
+def _record_answer(conn, chat_id, question_id, topic, correct, now, user_answer, accuracy,
+                   with_feedback, ordinal):
+    result = {'common_errors': [], 'topic_stats': None, 'user_mistake': None}
+
+    # قدرة المستخدم قبل هذه الإجابة
+    user = conn.execute('SELECT score, attempts FROM users WHERE chat_id = ?', (chat_id,)).fetchone()
+    record_outcome(conn, question_id, correct, ability(*user) if user else ability(0, 0))
+
+    conn.execute('''
+    UPDATE users SET score = score + ?, attempts = attempts + 1, last_active = ?
+    WHERE chat_id = ?''', (correct, now, chat_id))
+
+    conn.execute('''
+    INSERT INTO user_topics (chat_id, topic, correct, attempts)
+    VALUES (?, ?, ?, 1)
+    ON CONFLICT(chat_id, topic)
+    DO UPDATE SET correct = correct + excluded.correct, attempts = attempts + 1''',
+    (chat_id, topic, correct))
+
+    if not correct and user_answer is not None:
+        (answer_count,) = conn.execute('''
+        INSERT INTO error_analysis (question_id, wrong_answer, last_seen)
+        VALUES (?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(question_id, wrong_answer)
+        DO UPDATE SET count = count + 1, last_seen = CURRENT_TIMESTAMP
+        RETURNING count''', (question_id, user_answer)).fetchone()
+        add_wrong_answer(conn, question_id, user_answer, answer_count)
+
+        conn.execute('''
+        INSERT INTO user_mistakes (chat_id, question_id, wrong_answer, accuracy)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(chat_id, question_id, wrong_answer)
+        DO UPDATE SET count = count + 1, accuracy = MIN(accuracy, ?), last_updated = CURRENT_TIMESTAMP''',
+        (chat_id, question_id, user_answer, accuracy, accuracy))
+
+    if correct:
+        # سؤال صعب أُجيب عنه بشكل صحيح لا يعود إلى قائمة المراجعة
+        conn.execute('DELETE FROM hard_questions WHERE chat_id = ? AND question_id = ?', (chat_id, question_id))
+
+    update_review(conn, chat_id, question_id, review_quality(correct, accuracy))
+
+    if ordinal is not None:
+        mark_answered(conn, chat_id, question_id, ordinal)
+
+    if with_feedback:
+        result['common_errors'] = conn.execute('''
+        SELECT representative, count
+        FROM error_clusters
+        WHERE question_id = ?
+        ORDER BY count DESC LIMIT 3''', (question_id,)).fetchall()
+
+        result['topic_stats'] = conn.execute('''
+        SELECT correct, attempts
+        FROM user_topics
+        WHERE chat_id = ? AND topic = ?''', (chat_id, topic)).fetchone()
+
+        result['user_mistake'] = conn.execute('''
+        SELECT question_id, wrong_answer, count
+        FROM user_mistakes
+        WHERE chat_id = ? AND question_id = ?
+        ORDER BY count DESC LIMIT 1''', (chat_id, question_id)).fetchone()
+
+    return result
+
+
+def record_question_rating(chat_id, question_id, rating):
+    """Store an easy/hard rating; "hard" also schedules the question for review"""
+    get_writer().call(_record_question_rating, chat_id, question_id, rating)
+
+
+def _record_question_rating(conn, chat_id, question_id, rating):
+    conn.execute('''
+    INSERT INTO question_ratings (chat_id, question_id, rating)
+    VALUES (?, ?, ?)''', (chat_id, question_id, rating))
+
+    if rating == 'hard':
+        conn.execute('''
+        INSERT OR IGNORE INTO hard_questions (chat_id, question_id)
+        VALUES (?, ?)''', (chat_id, question_id))
+        schedule_hard(conn, chat_id, question_id)
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+
+"""
+Arabic text processing
+توحيد النصوص العربية قبل المقارنة
+"""
+
+import pyarabic.araby as araby
+
+
+def preprocess_arabic(text):
+    text = araby.strip_tashkeel(text)
+    text = araby.normalize_hamza(text)
+    text = araby.strip_tatweel(text)
+    text = araby.normalize_ligature(text)  # إضافة هذه السطر
+    text = text.replace("،", "").replace(".", "").strip()  # إزالة علامات الترقيم
+    return text
+
+
+# حروف تُكتب بأكثر من شكل في الإجابات (بعد توحيد الهمزات)
+_BUCKET_LETTERS = str.maketrans({'ة': 'ه', 'ى': 'ي'})
+
+
+def answer_bucket(text):
+    """Coarser key than preprocess_arabic for grouping near-identical wrong answers.
+
+    Drops punctuation and spaces, unifies teh marbuta/heh and alef maksura/yeh
+    and collapses repeated letters. Idempotent: answer_bucket(answer_bucket(t)) == answer_bucket(t).
+    """
+    text = preprocess_arabic(text).lower().translate(_BUCKET_LETTERS)
+    letters = [ch for ch in text if ch.isalnum()]
+    return ''.join(ch for i, ch in enumerate(letters) if i == 0 or ch != letters[i - 1])
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark: similarity engines vs difflib.SequenceMatcher over the whole bank.
+
+For every reference answer in the bank (answer / answer_example) we grade
+a set of synthetic student answers: the exact answer, character-level typos
+at increasing rates, word prefixes, shuffled words, another question's
+answer, and long pasted paragraphs. Each engine is compared with
+SequenceMatcher on the accept/reject decision at the 60% threshold, on the
+mean absolute score difference, and on per-call latency.
+
+A second table times grade_answer itself: exact=True is what the bot
+runs (no early exit, because the accuracy is shown and stored),
+exact=False only decides pass/fail.
+
+Usage:
+    python benchmarks/bench_grading.py [--seed 0] [--paste-chars 5000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from arabic_text import preprocess_arabic  # noqa: E402
+from grading import SIMILARITY_ENGINES, SIMILARITY_THRESHOLD, SequenceMatcherSimilarity, grade_answer  # noqa: E402
+from question_bank import load_questions  # noqa: E402
+
+TYPO_RATES = (0.0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6)
+
+
+def reference_answers():
+    refs = set()
+    for q in load_questions():
+        for key in ('answer', 'answer_example'):
+            if q.get(key):
+                refs.add(preprocess_arabic(q[key]))
+    return sorted(refs)
+
+
+def build_cases(refs, rng, paste_chars):
+    letters = sorted(set(''.join(refs)) - {' '})
+
+    def typo(text, rate):
+        out = []
+        for ch in text:
+            r = rng.random()
+            if r < rate / 3:
+                continue
+            if r < 2 * rate / 3:
+                out.append(rng.choice(letters))
+            elif r < rate:
+                out.extend((ch, rng.choice(letters)))
+            else:
+                out.append(ch)
+        return ''.join(out)
+
+    cases = []
+    for ref in refs:
+        for rate in TYPO_RATES:
+            cases.append((typo(ref, rate), ref))
+        words = ref.split()
+        for k in range(1, len(words)):
+            cases.append((' '.join(words[:k]), ref))
+        rng.shuffle(words)
+        cases.append((' '.join(words), ref))
+        cases.append((rng.choice(refs), ref))
+        cases.append((ref + ' ' + rng.choice(refs), ref))
+        paste = ' '.join(rng.choice(refs) for _ in range(paste_chars // 20))[:paste_chars]
+        cases.append((ref + ' ' + paste, ref))
+    return cases
+
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * p / 100))]
+
+
+def measure(engine, cases, threshold):
+    scores, latencies = [], []
+    for answer, reference in cases:
+        started = time.perf_counter()
+        scores.append(engine.score(answer, reference, threshold))
+        latencies.append(time.perf_counter() - started)
+    return scores, sorted(latencies)
+
+
+def measure_grading(engine, cases, exact):
+    accuracies, latencies = [], []
+    for answer, reference in cases:
+        q, normalized = {'type': 'text', 'answer': reference}, {'answer': reference}
+        started = time.perf_counter()
+        accuracies.append(grade_answer(q, normalized, answer, engine, exact=exact)[2] / 100)
+        latencies.append(time.perf_counter() - started)
+    return accuracies, sorted(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--paste-chars', type=int, default=5000)
+    args = parser.parse_args()
+
+    refs = reference_answers()
+    cases = build_cases(refs, random.Random(args.seed), args.paste_chars)
+    threshold = SIMILARITY_THRESHOLD / 100
+    print(f"{len(refs)} reference answers, {len(cases)} graded answers\n")
+
+    baseline, _ = measure(SequenceMatcherSimilarity(), cases, None)
+    expected = [s > threshold for s in baseline]
+
+    print(f"{'engine':<18}{'agreement':>10}{'MAE':>8}{'p50 us':>10}{'p99 us':>10}{'max us':>11}")
+    for name, engine_cls in SIMILARITY_ENGINES.items():
+        scores, latencies = measure(engine_cls(), cases, threshold)
+        agreement = sum((s > threshold) == e for s, e in zip(scores, expected)) / len(cases)
+        mae = sum(abs(s - b) for s, b in zip(scores, baseline)) / len(cases)
+        print(f"{name:<18}{agreement:>9.1%}{mae:>8.3f}"
+              f"{percentile(latencies, 50) * 1e6:>10.1f}{percentile(latencies, 99) * 1e6:>10.1f}"
+              f"{latencies[-1] * 1e6:>11.1f}")
+
+    print(f"\ngrade_answer\n{'engine':<18}{'exact':>7}{'MAE':>8}{'p50 us':>10}{'p99 us':>10}{'max us':>11}")
+    for name, engine_cls in SIMILARITY_ENGINES.items():
+        for exact in (True, False):
+            accuracies, latencies = measure_grading(engine_cls(), cases, exact)
+            mae = sum(abs(a - b) for a, b in zip(accuracies, baseline)) / len(cases)
+            print(f"{name:<18}{str(exact):>7}{mae:>8.3f}"
+                  f"{percentile(latencies, 50) * 1e6:>10.1f}{percentile(latencies, 99) * 1e6:>10.1f}"
+                  f"{latencies[-1] * 1e6:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+
+"""
+Micro-benchmark: QuestionBank lookup vs the old linear scan by id.
+
+Usage:
+    python benchmarks/bench_question_bank.py [--sizes 100,10000,50000]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from question_bank import QuestionBank  # noqa: E402
+
+
+def build_questions(base, size):
+    """Replicate the real bank up to `size` questions with unique ids"""
+    questions = []
+    for i in range(size):
+        q = dict(base[i % len(base)])
+        q['id'] = f"q_{i:06d}"
+        questions.append(q)
+    return questions
+
+
+def linear_lookup(questions, q_id):
+    return next((q for q in questions if q['id'] == q_id), None)
+
+
+def run(size, base, lookups=2000):
+    questions = build_questions(base, size)
+    bank = QuestionBank(questions)
+    ids = [random.choice(questions)['id'] for _ in range(lookups)]
+
+    scan = timeit.timeit(lambda: [linear_lookup(questions, i) for i in ids], number=1)
+    indexed = timeit.timeit(lambda: [bank.get(i) for i in ids], number=1)
+
+    print(f"{size:>8} questions | scan {scan / lookups * 1e6:10.2f} us/lookup"
+          f" | bank {indexed / lookups * 1e6:8.3f} us/lookup"
+          f" | x{scan / indexed:,.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='100,1000,10000,50000')
+    args = parser.parse_args()
+
+    with open(os.path.join(ROOT, 'questions_full.json'), 'r', encoding='utf-8') as f:
+        base = json.load(f)
+
+    random.seed(0)
+    for size in (int(s) for s in args.sizes.split(',')):
+        run(size, base)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+"""
+Question difficulty calibration
+معايرة صعوبة الأسئلة وقدرتها على التمييز من نتائج الإجابات
+
+Every answer adds to the question's sufficient statistics in
+question_calibration (migration 10): n, correct, and the sums of the
+answering user's ability t (their smoothed accuracy before the answer),
+t^2 and correct*t. These are enough to compute, for every question at
+once with NumPy:
+
+- p_value: the smoothed share of correct answers (classical difficulty);
+- discrimination: the point-biserial correlation between being correct
+  and the user's ability (low or negative = the question does not
+  separate strong and weak users);
+- b = logit(1 - p) (Rasch-style difficulty) mapped to difficulty 1..5.
+
+Only questions with new answers since the last run (dirty = 1) are
+recomputed, and the results are written back to questions (p_value,
+discrimination, difficulty). The difficulty levels are then kept in memory
+by ordinal, so get_question_for_user targets a level without a query.
+
+Usage:
+    python calibration.py [--db science_bot.db] [--all]
+"""
+
+import argparse
+import os
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+from db import DATABASE, connect
+from db_writer import get_writer
+
+# أقل عدد إجابات قبل اعتماد صعوبة السؤال
+MIN_ANSWERS = 20
+# نسبة الإجابات الصحيحة التي نستهدفها للمستخدم (سؤال فيه تحدٍ لكنه ممكن)
+TARGET_SUCCESS = 0.7
+# حدود b بين مستويات الصعوبة 1..5
+LEVEL_BOUNDS = (-1.5, -0.5, 0.5, 1.5)
+
+
+def ability(score, attempts):
+    """Smoothed accuracy of a user (0.5 for a new user)"""
+    return ((score or 0) + 1) / ((attempts or 0) + 2)
+
+
+def record_outcome(conn, question_id, correct, user_ability):
+    """Add one answer to the question's sufficient statistics (caller's transaction)"""
+    conn.execute('''
+    INSERT INTO question_calibration (question_id, n, correct, sum_t, sum_t2, sum_correct_t, dirty)
+    VALUES (?, 1, ?, ?, ?, ?, 1)
+    ON CONFLICT(question_id) DO UPDATE SET
+        n = n + 1,
+        correct = correct + excluded.correct,
+        sum_t = sum_t + excluded.sum_t,
+        sum_t2 = sum_t2 + excluded.sum_t2,
+        sum_correct_t = sum_correct_t + excluded.sum_correct_t,
+        dirty = 1''',
+    (question_id, correct, user_ability, user_ability * user_ability, correct * user_ability))
+
+
+def _levels(b):
+    return np.digitize(b, LEVEL_BOUNDS) + 1
+
+
+def estimate(stats):
+    """Vectorized estimates for a DataFrame of question_calibration rows.
+
+    Returns a DataFrame with question_id, p_value, discrimination and
+    difficulty. discrimination is NaN when either variance is zero.
+    """
+    n = stats['n'].to_numpy(dtype=float)
+    correct = stats['correct'].to_numpy(dtype=float)
+    mean_t = stats['sum_t'].to_numpy(dtype=float) / n
+    var_t = stats['sum_t2'].to_numpy(dtype=float) / n - mean_t ** 2
+    p_raw = correct / n
+    cov = stats['sum_correct_t'].to_numpy(dtype=float) / n - p_raw * mean_t
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        discrimination = cov / np.sqrt(var_t * p_raw * (1 - p_raw))
+    discrimination = np.where(np.isfinite(discrimination), np.clip(discrimination, -1, 1), np.nan)
+
+    p_value = (correct + 1) / (n + 2)
+    b = np.log((1 - p_value) / p_value)
+    return pd.DataFrame({
+        'question_id': stats['question_id'],
+        'p_value': p_value,
+        'discrimination': discrimination,
+        'difficulty': _levels(b),
+    })
+
+
+def calibrate(conn, min_answers=MIN_ANSWERS, everything=False):
+    """Recompute dirty questions (or all with `everything`); returns how many were written"""
+    stats = pd.read_sql_query(f'''
+    SELECT question_id, n, correct, sum_t, sum_t2, sum_correct_t
+    FROM question_calibration
+    WHERE {'1' if everything else 'dirty = 1'} AND n >= ?''', conn, params=(min_answers,))
+    conn.execute('UPDATE question_calibration SET dirty = 0 WHERE dirty = 1')
+    if stats.empty:
+        return 0
+
+    result = estimate(stats)
+    conn.executemany('''
+    UPDATE questions SET p_value = ?, discrimination = ?, difficulty = ?
+    WHERE id = ?''', [
+        (float(p), None if np.isnan(r) else float(r), int(level), q_id)
+        for q_id, p, r, level in result[['question_id', 'p_value', 'discrimination', 'difficulty']]
+        .itertuples(index=False)
+    ])
+    return len(result)
+
+
+def target_level(score, attempts, target_success=TARGET_SUCCESS):
+    """Difficulty level at which the user should succeed about `target_success` of the time"""
+    theta = np.log(ability(score, attempts) / (1 - ability(score, attempts)))
+    b = theta - np.log(target_success / (1 - target_success))
+    return int(_levels(b))
+
+
+class DifficultyCalibrator:
+    """Runs `calibrate` on the writer thread and keeps {ordinal: difficulty} in memory"""
+
+    def __init__(self, path=DATABASE, min_answers=MIN_ANSWERS):
+        self.path = path
+        self.min_answers = min_answers
+        self.levels = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, path=DATABASE):
+        return cls(path, int(os.getenv('CALIBRATION_MIN_ANSWERS', MIN_ANSWERS)))
+
+    def start(self, scheduler, interval=None):
+        interval = interval or float(os.getenv('CALIBRATION_INTERVAL', 600))
+        scheduler.add_job(self.run, 'interval', seconds=interval)
+
+    def run(self):
+        with self._lock:
+            updated = get_writer(self.path).call(calibrate, self.min_answers)
+            if updated or not self.levels:
+                self.load()
+        if updated:
+            print(f"🎯 معايرة صعوبة الأسئلة: {updated} سؤال")
+        return updated
+
+    def load(self):
+        conn = connect(self.path)
+        try:
+            self.levels = dict(conn.execute('''
+            SELECT ordinal, difficulty FROM questions
+            WHERE p_value IS NOT NULL AND ordinal IS NOT NULL''').fetchall())
+        finally:
+            conn.close()
+
+    def prefer(self, target):
+        """Predicate for AdaptiveSelector.pick: calibrated questions within one level of `target`.
+
+        Questions without a calibration yet are always accepted so they
+        collect answers.
+        """
+        levels = self.levels
+        return lambda ordinal: abs(levels.get(ordinal, target) - target) <= 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=DATABASE)
+    parser.add_argument('--min-answers', type=int, default=MIN_ANSWERS)
+    parser.add_argument('--all', action='store_true', help='recompute every question, not only the changed ones')
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    try:
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            updated = calibrate(conn, args.min_answers, args.all)
+        print(f"✅ Calibrated {updated} questions")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
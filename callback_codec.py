@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+"""
+Signed MCQ callback data
+ترميز السؤال (الترتيب، إصدار البنك) والاختيار في callback_data مع توقيع HMAC
+
+An MCQ button carries everything needed to grade the tap:
+
+    m:<ordinal>:<bank version>:<issued>:<choice>:<tag>
+
+numbers in base 36 (`issued` is the unix time the question was sent) and
+`tag` the first 8 bytes of
+HMAC-SHA256(secret, "chat_id:ordinal:version:issued:choice"), base64url.
+The chat id is part of the signed message but not of the data (Telegram
+sends it with the tap), so a button cannot be forged or replayed by
+another chat. A typical value is about 26 bytes, well under Telegram's 64.
+
+A button expires `ttl` seconds after it was sent, and each sent question
+is graded once: `claim_tap` records (chat_id, ordinal, issued) in mcq_taps
+(migration 13), so tapping an old message again changes nothing. Rows
+older than the ttl are useless (the codec rejects those taps) and are
+deleted by `purge_taps`.
+
+The secret is CALLBACK_SECRET, or derived from TELEGRAM_BOT_TOKEN so every
+worker of the same bot agrees on it without extra configuration.
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import time
+
+PREFIX = 'm:'
+TAG_BYTES = 8
+# حد تيليجرام لطول callback_data
+MAX_CALLBACK_BYTES = 64
+# مدة صلاحية الزر (ثانية)، مثل مدة السؤال النشط
+CALLBACK_TTL = 24 * 60 * 60
+# فرق الساعة المقبول بين العمليات
+CLOCK_SKEW = 60
+
+_DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
+
+def _base36(number):
+    if number < 0:
+        raise ValueError(f"Negative value in callback data: {number}")
+    digits = ''
+    while True:
+        number, rest = divmod(number, 36)
+        digits = _DIGITS[rest] + digits
+        if not number:
+            return digits
+
+
+def default_secret():
+    secret = os.getenv('CALLBACK_SECRET')
+    if secret:
+        return secret.encode('utf-8')
+    token = os.getenv('TELEGRAM_BOT_TOKEN', '')
+    return hashlib.sha256(b'mcq-callback:' + token.encode('utf-8')).digest()
+
+
+class CallbackCodec:
+    def __init__(self, secret=None, ttl=CALLBACK_TTL):
+        self.secret = secret or default_secret()
+        self.ttl = ttl
+
+    @classmethod
+    def from_env(cls):
+        return cls(ttl=int(os.getenv('CALLBACK_TTL', CALLBACK_TTL)))
+
+    def _tag(self, chat_id, ordinal, version, issued, choice):
+        message = f"{chat_id}:{ordinal}:{version}:{issued}:{choice}".encode('utf-8')
+        digest = hmac.new(self.secret, message, hashlib.sha256).digest()[:TAG_BYTES]
+        return base64.urlsafe_b64encode(digest).rstrip(b'=').decode('ascii')
+
+    def encode(self, chat_id, ordinal, version, choice, issued=None):
+        """callback_data for one choice; every button of one question must share `issued`"""
+        issued = int(time.time() if issued is None else issued)
+        data = (f"{PREFIX}{_base36(ordinal)}:{_base36(version)}:{_base36(issued)}:{_base36(choice)}:"
+                f"{self._tag(chat_id, ordinal, version, issued, choice)}")
+        if len(data.encode('utf-8')) > MAX_CALLBACK_BYTES:
+            raise ValueError(f"callback_data too long: {data}")
+        return data
+
+    def decode(self, chat_id, data, now=None):
+        """(ordinal, version, issued, choice), or None if `data` is malformed, forged or expired"""
+        try:
+            ordinal, version, issued, choice, tag = data[len(PREFIX):].split(':')
+            ordinal, version, issued, choice = (int(ordinal, 36), int(version, 36),
+                                                int(issued, 36), int(choice, 36))
+        except ValueError:
+            return None
+        if not hmac.compare_digest(tag, self._tag(chat_id, ordinal, version, issued, choice)):
+            return None
+        now = time.time() if now is None else now
+        if not now - self.ttl < issued <= now + CLOCK_SKEW:
+            return None
+        return ordinal, version, issued, choice
+
+    @staticmethod
+    def matches(data):
+        return data.startswith(PREFIX)
+
+
+def claim_tap(conn, chat_id, ordinal, issued):
+    """True for the first tap on a sent question, False if it was already graded (caller's transaction)"""
+    return conn.execute('''
+    INSERT OR IGNORE INTO mcq_taps (chat_id, ordinal, issued) VALUES (?, ?, ?)''',
+    (chat_id, ordinal, issued)).rowcount == 1
+
+
+def purge_taps(conn, ttl=CALLBACK_TTL, now=None):
+    """Delete taps on buttons that have expired anyway; returns the number of rows deleted"""
+    now = time.time() if now is None else now
+    return conn.execute('DELETE FROM mcq_taps WHERE issued <= ?', (int(now - ttl),)).rowcount
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+"""
+Check that the bot's queries are served by indexes.
+
+Collects every SQL string literal passed to execute()/executemany() in the
+given modules, runs EXPLAIN QUERY PLAN for each one against an in-memory
+database built by migrations.py, and fails when a plan contains a full
+scan: "SCAN <table>", or "SCAN <table> USING [COVERING] INDEX <index>",
+which walks the whole index (an index lookup is planned as SEARCH). The
+one bounded index scan is ORDER BY ... LIMIT read in index order: the query
+has a LIMIT and the plan sorts and groups nothing (no "USE TEMP B-TREE").
+
+A scan that is intended (e.g. a broadcast to every user) is allowed by
+putting a comment with the reason inside the query itself:
+
+    SELECT chat_id FROM users  -- full-scan: the reminder goes to every user
+
+Scans of the stats_* rollup tables are fine: their size grows with the
+number of days, not with users or answers. Queries built at runtime (not
+a literal) are listed as skipped.
+
+Usage:
+    python check_query_plans.py [-v] [files ...]
+"""
+
+import argparse
+import ast
+import re
+import sqlite3
+import sys
+
+from migrations import migrate
+from stats_rollups import ROLLUP_TABLES
+
+DEFAULT_FILES = ('quiz.py', 'admin_dashboard.py', 'answers.py', 'error_clusters.py',
+                 'adaptive_selector.py', 'spaced_repetition.py', 'session_store.py', 'callback_codec.py',
+                 'answered_bits.py')
+
+FULL_SCAN_MARKER = '-- full-scan:'
+
+_PLANNED = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+_TABLE_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?( USING (?:COVERING )?INDEX \w+)?$')
+_LIMIT = re.compile(r'\bLIMIT\b', re.IGNORECASE)
+
+
+def collect_queries(path):
+    """(line, sql) for string literals passed to execute/executemany, and lines of non-literal ones"""
+    with open(path, encoding='utf-8') as f:
+        tree = ast.parse(f.read(), path)
+    queries, skipped = [], []
+    for node in ast.walk(tree):
+        if not (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute)
+                and node.func.attr in ('execute', 'executemany') and node.args):
+            continue
+        arg = node.args[0]
+        if isinstance(arg, ast.Constant) and isinstance(arg.value, str):
+            queries.append((node.lineno, arg.value))
+        else:
+            skipped.append(node.lineno)
+    return sorted(queries), sorted(skipped)
+
+
+def full_scans(conn, sql):
+    """Tables the plan reads with a full scan"""
+    params = [None] * sql.count('?')
+    plan = conn.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+    # ORDER BY ... LIMIT بترتيب الفهرس يقرأ أول LIMIT صفوف فقط
+    index_order_limit = _LIMIT.search(sql) and not any('TEMP B-TREE' in row[3] for row in plan)
+    tables = []
+    for row in plan:
+        match = _TABLE_SCAN.match(row[3])
+        if not match or match.group(1) in ROLLUP_TABLES:
+            continue
+        if match.group(2) and index_order_limit:
+            continue
+        tables.append(match.group(1))
+    return tables, [row[3] for row in plan]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('files', nargs='*', default=DEFAULT_FILES)
+    parser.add_argument('-v', '--verbose', action='store_true', help='print every plan')
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(':memory:')
+    migrate(conn)
+
+    failures = 0
+    checked = 0
+    for path in args.files:
+        queries, skipped = collect_queries(path)
+        for line, sql in queries:
+            if not sql.lstrip().upper().startswith(_PLANNED):
+                continue
+            checked += 1
+            where = f"{path}:{line}"
+            try:
+                tables, plan = full_scans(conn, sql)
+            except sqlite3.Error as e:
+                failures += 1
+                print(f"❌ {where}: {e}")
+                print("    " + " ".join(sql.split()))
+                continue
+            if args.verbose:
+                print(f"{where}\n    " + "\n    ".join(plan))
+            if not tables:
+                continue
+            if FULL_SCAN_MARKER in sql:
+                if args.verbose:
+                    print(f"    (allowed: {sql.split(FULL_SCAN_MARKER, 1)[1].splitlines()[0].strip()})")
+                continue
+            failures += 1
+            print(f"❌ {where}: full scan of {', '.join(tables)}")
+            print("    " + " ".join(sql.split()))
+        for line in skipped:
+            print(f"⏭️  {path}:{line}: query is not a literal, skipped")
+
+    print(f"{checked} queries checked, {failures} failed")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
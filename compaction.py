@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+"""
+Mistake tables compaction
+دمج الإجابات الخاطئة النادرة القديمة وأرشفة التفاصيل القديمة من user_mistakes و error_analysis
+
+Both tables keep the raw wrong_answer text, so every distinct typo is a
+row. This job:
+
+1. folds rows that are rare (count <= rare_max_count) and older than
+   fold_after_days by their normalized bucket (arabic_text.answer_bucket),
+   kept in the answer_key column (migration 8). The first row of a bucket
+   becomes the group row and keeps its raw wrong_answer, which students
+   see and regrade.py grades; later rows of the bucket add their counts to
+   it and are deleted;
+2. archives rows not updated for archive_after_days to gzip JSONL files
+   (archive/<table>-<date>.jsonl.gz) and deletes them.
+
+Folded rows are archived too, so no detail is lost. Work is done in
+batches of `batch_size` rows, one short transaction each on the writer
+thread, with a pause between batches so the bot's writes interleave.
+Archiving is at-least-once: if a delete fails after the file was written,
+the rows are archived again on the next run.
+
+Runs nightly on the bot's scheduler; can also be run by hand:
+    python compaction.py [--db science_bot.db]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+from datetime import date
+
+from arabic_text import answer_bucket
+from db import DATABASE
+from db_writer import get_writer
+
+
+class _Table:
+    def __init__(self, name, time_column, key_columns, merge, merge_columns):
+        self.name = name
+        self.time_column = time_column
+        self.key_columns = key_columns
+        # SET ... للصف الممثل، بقيم merge_columns من الصف المدمج
+        self.merge = merge
+        self.merge_columns = merge_columns
+
+
+TABLES = (
+    _Table('user_mistakes', 'last_updated', ('chat_id', 'question_id'),
+           'count = count + ?, accuracy = MIN(accuracy, ?), last_updated = MAX(last_updated, ?)',
+           ('count', 'accuracy', 'last_updated')),
+    _Table('error_analysis', 'last_seen', ('question_id',),
+           'count = count + ?, last_seen = MAX(last_seen, ?)',
+           ('count', 'last_seen')),
+)
+
+
+class MistakesCompactor:
+    def __init__(self, path=DATABASE, archive_dir='archive', fold_after_days=30, rare_max_count=1,
+                 archive_after_days=180, batch_size=200, pause=0.05):
+        self.path = path
+        self.archive_dir = archive_dir
+        self.fold_after_days = fold_after_days
+        self.rare_max_count = rare_max_count
+        self.archive_after_days = archive_after_days
+        self.batch_size = batch_size
+        self.pause = pause
+
+    @classmethod
+    def from_env(cls, path=DATABASE):
+        return cls(
+            path,
+            archive_dir=os.getenv('COMPACTION_ARCHIVE_DIR', 'archive'),
+            fold_after_days=int(os.getenv('COMPACTION_FOLD_AFTER_DAYS', 30)),
+            rare_max_count=int(os.getenv('COMPACTION_RARE_MAX_COUNT', 1)),
+            archive_after_days=int(os.getenv('COMPACTION_ARCHIVE_AFTER_DAYS', 180)),
+            batch_size=int(os.getenv('COMPACTION_BATCH_SIZE', 200)),
+        )
+
+    def start(self, scheduler, hour=3):
+        scheduler.add_job(self.run, 'cron', hour=hour)
+
+    def run(self):
+        """Fold then archive both tables; returns {table: (folded, archived)}"""
+        writer = get_writer(self.path)
+        started = time.perf_counter()
+        result = {}
+        for table in TABLES:
+            folded = self._batches(writer, self._fold_batch, table)
+            archived = self._batches(writer, self._archive_batch, table)
+            result[table.name] = (folded, archived)
+        if any(folded or archived for folded, archived in result.values()):
+            summary = ' | '.join(f"{name}: {folded} مدمج، {archived} مؤرشف"
+                                 for name, (folded, archived) in result.items())
+            print(f"🧹 ضغط جداول الأخطاء ({time.perf_counter() - started:.1f}s): {summary}")
+        return result
+
+    def _batches(self, writer, batch_fn, table):
+        total = 0
+        after_id = 0
+        while True:
+            done, after_id = writer.call(batch_fn, table, after_id)
+            total += done
+            if after_id is None:
+                return total
+            time.sleep(self.pause)
+
+    def _fold_batch(self, conn, table, after_id):
+        """Fold one batch of rare old rows; returns (rows folded, next after_id or None)"""
+        rows = conn.execute(f'''
+        SELECT * FROM {table.name}
+        WHERE id > ? AND answer_key IS NULL AND count <= ? AND {table.time_column} < datetime('now', ?)
+        ORDER BY id LIMIT ?''',
+        (after_id, self.rare_max_count, f'-{self.fold_after_days} days', self.batch_size)).fetchall()
+        if not rows:
+            return 0, None
+
+        match = ' AND '.join(f'{column} = ?' for column in table.key_columns)
+        folded = []
+        for row in rows:
+            bucket = answer_bucket(row['wrong_answer'] or '')
+            if not bucket:
+                continue
+            keys = tuple(row[column] for column in table.key_columns)
+            group = conn.execute(f'''
+            SELECT id FROM {table.name} WHERE {match} AND answer_key = ?''', keys + (bucket,)).fetchone()
+            if group is None:
+                # أول صف في المجموعة يبقى بنصه الأصلي ممثلاً لها
+                conn.execute(f'UPDATE {table.name} SET answer_key = ? WHERE id = ?', (bucket, row['id']))
+                continue
+            conn.execute(f'UPDATE {table.name} SET {table.merge} WHERE id = ?',
+                         tuple(row[column] for column in table.merge_columns) + (group['id'],))
+            folded.append(dict(row, folded_into=group['id']))
+
+        self._archive(table.name, folded)
+        conn.executemany(f'DELETE FROM {table.name} WHERE id = ?', [(row['id'],) for row in folded])
+        return len(folded), rows[-1]['id']
+
+    def _archive_batch(self, conn, table, after_id):
+        """Archive and delete one batch of rows older than the window"""
+        rows = conn.execute(f'''
+        SELECT * FROM {table.name}
+        WHERE id > ? AND {table.time_column} < datetime('now', ?)
+        ORDER BY id LIMIT ?''',
+        (after_id, f'-{self.archive_after_days} days', self.batch_size)).fetchall()
+        if not rows:
+            return 0, None
+
+        self._archive(table.name, [dict(row) for row in rows])
+        conn.executemany(f'DELETE FROM {table.name} WHERE id = ?', [(row['id'],) for row in rows])
+        return len(rows), rows[-1]['id']
+
+    def _archive(self, table_name, records):
+        if not records:
+            return
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(self.archive_dir, f"{table_name}-{date.today().isoformat()}.jsonl.gz")
+        # كل إضافة عضو gzip جديد في نفس الملف (zcat و gzip.open يقرآنه كاملاً)
+        with gzip.open(path, 'at', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=DATABASE)
+    args = parser.parse_args()
+
+    compactor = MistakesCompactor.from_env(args.db)
+    result = compactor.run()
+    for name, (folded, archived) in result.items():
+        print(f"{name}: folded {folded}, archived {archived}")
+    get_writer(args.db).stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
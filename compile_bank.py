@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+"""
+Compile the JSON question banks into a single precompiled artifact.
+
+The artifact holds the questions, their ordinals, the normalized choices,
+keywords and answers, and the subject/topic indexes, as plain marshalled
+data checked against a SHA-256 in the header. The bot loads it at startup
+and falls back to the JSON files when it is stale (any source file changed
+since the compile) or fails the check.
+
+Ordinals are seeded from the questions table (question_sync.load_ordinals)
+so existing questions keep their ordinal and removed ones are never
+reused; otherwise the bot would reject the artifact as incompatible with
+the ordinals it already handed out.
+
+Usage:
+    python compile_bank.py [--output questions.bank] [--db science_bot.db] [--check]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from db import DATABASE, connect
+from question_bank import (
+    BANK_ARTIFACT, QUESTION_SOURCES, QuestionBank, load_questions, read_artifact, write_artifact,
+)
+from question_sync import load_ordinals
+
+VALID_TYPES = {'mcq', 'text', 'tf', 'calculation'}
+
+
+def validate_questions(questions):
+    """Return a list of human readable problems in the merged bank"""
+    errors = []
+    seen = set()
+    for i, q in enumerate(questions):
+        q_id = q.get('id')
+        where = f"#{i} ({q_id})"
+        if not q_id:
+            errors.append(f"{where}: missing id")
+            continue
+        if q_id in seen:
+            errors.append(f"{where}: duplicate id")
+        seen.add(q_id)
+
+        if not q.get('question'):
+            errors.append(f"{where}: missing question text")
+        if q.get('type') not in VALID_TYPES:
+            errors.append(f"{where}: unknown type {q.get('type')!r}")
+
+        if q.get('type') == 'mcq':
+            choices = q.get('choices') or []
+            indices = q.get('correct_indices') or []
+            if len(choices) < 2:
+                errors.append(f"{where}: mcq needs at least two choices")
+            if not indices:
+                errors.append(f"{where}: mcq without correct_indices")
+            if any(not isinstance(idx, int) or not 0 <= idx < len(choices) for idx in indices):
+                errors.append(f"{where}: correct_indices out of range")
+        elif not q.get('answer_keywords') and not q.get('answer'):
+            errors.append(f"{where}: no answer_keywords or answer to grade against")
+    return errors
+
+
+def build_bank(questions, db_path=DATABASE):
+    """QuestionBank with the ordinals already synced to `db_path` (fresh ordinals if there is no database)"""
+    if not db_path or not os.path.exists(db_path):
+        return QuestionBank(questions)
+    conn = connect(db_path)
+    try:
+        ordinals, next_ordinal = load_ordinals(conn)
+    finally:
+        conn.close()
+    return QuestionBank(questions, ordinals=ordinals, next_ordinal=next_ordinal)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', default=BANK_ARTIFACT, help='artifact path')
+    parser.add_argument('--db', default=DATABASE, help='database whose question ordinals are kept')
+    parser.add_argument('--check', action='store_true', help='only validate, do not write the artifact')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    questions = load_questions(QUESTION_SOURCES)
+    errors = validate_questions(questions)
+    for error in errors:
+        print(f"❌ {error}")
+    if errors:
+        print(f"{len(errors)} problem(s) found, artifact not written")
+        return 1
+
+    print(f"✅ {len(questions)} questions valid")
+    if args.check:
+        return 0
+
+    bank = build_bank(questions, args.db)
+    write_artifact(bank, args.output, QUESTION_SOURCES)
+    print(f"📦 wrote {args.output} in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    started = time.perf_counter()
+    state = read_artifact(args.output, QUESTION_SOURCES)
+    QuestionBank.from_state(state)
+    print(f"⚡ artifact loads in {(time.perf_counter() - started) * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
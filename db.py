@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+"""
+Database connections
+اتصال SQLite دائم لكل خيط مع إعدادات WAL بدلاً من فتح اتصال جديد في كل دالة
+"""
+
+import sqlite3
+import threading
+
+DATABASE = 'science_bot.db'
+
+# مدة انتظار القفل قبل ظهور "database is locked" (بالمللي ثانية)
+BUSY_TIMEOUT_MS = 5000
+# عدد الجمل المحضّرة المحفوظة لكل اتصال
+STATEMENT_CACHE_SIZE = 256
+
+_local = threading.local()
+
+
+def connect(path=DATABASE):
+    """Open a new connection with the bot's pragmas"""
+    conn = sqlite3.connect(
+        path,
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+    return conn
+
+
+def get_connection(path=DATABASE):
+    """Return this thread's persistent connection, opening it on first use"""
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(path)
+    if conn is None:
+        conn = connections[path] = connect(path)
+    return conn
+
+
+def rollback_connection(path=DATABASE):
+    """Roll back a transaction left open on this thread (e.g. after an error)"""
+    conn = getattr(_local, 'connections', {}).get(path)
+    if conn is not None and conn.in_transaction:
+        conn.rollback()
+
+
+def close_connection(path=DATABASE):
+    conn = getattr(_local, 'connections', {}).pop(path, None)
+    if conn is not None:
+        conn.close()
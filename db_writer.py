@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+
+"""
+Single database writer
+خيط واحد ينفذ كل عمليات الكتابة من طابور ويجمعها في معاملات (لتفادي database is locked)
+"""
+
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from db import DATABASE, connect
+
+# الحد الأقصى لعدد العمليات في معاملة واحدة
+MAX_BATCH = 64
+
+_STOP = object()
+
+
+class DatabaseWriter:
+    """Runs every mutating statement on one thread and one connection.
+
+    Callers submit `fn(conn, *args)` and get a Future for its return value.
+    The writer takes whatever is queued (up to `max_batch` operations) and
+    runs it in one transaction. Each operation runs inside its own
+    SAVEPOINT, so a failing one is rolled back alone and only its Future
+    gets the exception. Futures are resolved after the commit, so a caller
+    that waits on its Future can read its own write from any connection.
+    """
+
+    def __init__(self, path=DATABASE, max_batch=MAX_BATCH):
+        self.path = path
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._operations = 0
+        self._failures = 0
+        self._last_commit_ms = 0.0
+        self._total_commit_ms = 0.0
+        self._max_commit_ms = 0.0
+
+    def start(self):
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='db-writer', daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self, timeout=10):
+        """Write what is still queued, then stop the thread"""
+        with self._thread_lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join(timeout)
+
+    def submit(self, fn, *args):
+        # يُعاد تشغيل الخيط إذا أُوقف (مثلاً كتابة متأخرة من atexit)
+        self.start()
+        future = Future()
+        self._queue.put((fn, args, future))
+        return future
+
+    def call(self, fn, *args):
+        """Submit and wait for the result (exceptions are re-raised here)"""
+        return self.submit(fn, *args).result()
+
+    def execute(self, sql, params=()):
+        """Future of the statement's lastrowid"""
+        return self.submit(_execute, sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.submit(_executemany, sql, seq_of_params)
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'queue_depth': self.queue_depth,
+                'batches': self._batches,
+                'operations': self._operations,
+                'failures': self._failures,
+                'last_commit_ms': self._last_commit_ms,
+                'avg_commit_ms': self._total_commit_ms / self._batches if self._batches else 0.0,
+                'max_commit_ms': self._max_commit_ms,
+            }
+
+    def _run(self):
+        conn = connect(self.path)
+        try:
+            while True:
+                batch = [self._queue.get()]
+                while len(batch) < self.max_batch:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                stopping = any(op is _STOP for op in batch)
+                batch = [op for op in batch if op is not _STOP]
+                if batch:
+                    self._write_batch(conn, batch)
+                if stopping and self._queue.empty():
+                    return
+        finally:
+            conn.close()
+
+    def _write_batch(self, conn, batch):
+        results = []
+        started = time.perf_counter()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for fn, args, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute('SAVEPOINT op')
+                try:
+                    results.append((future, True, fn(conn, *args)))
+                    conn.execute('RELEASE op')
+                except Exception as e:
+                    conn.execute('ROLLBACK TO op')
+                    conn.execute('RELEASE op')
+                    results.append((future, False, e))
+            conn.commit()
+        except Exception as e:
+            # فشل المعاملة كلها: كل العمليات تُبلغ بالخطأ
+            if conn.in_transaction:
+                conn.rollback()
+            print(f"⚠️ فشل حفظ دفعة من {len(batch)} عملية: {e}")
+            for _, _, future in batch:
+                if future.running():
+                    future.set_exception(e)
+            self._record(len(batch), len(batch), started)
+            return
+
+        failures = 0
+        for future, ok, value in results:
+            if ok:
+                future.set_result(value)
+            else:
+                failures += 1
+                print(f"⚠️ فشلت عملية كتابة: {value}")
+                future.set_exception(value)
+        self._record(len(batch), failures, started)
+
+    def _record(self, operations, failures, started):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            self._batches += 1
+            self._operations += operations
+            self._failures += failures
+            self._last_commit_ms = elapsed_ms
+            self._total_commit_ms += elapsed_ms
+            self._max_commit_ms = max(self._max_commit_ms, elapsed_ms)
+
+
+def _execute(conn, sql, params):
+    return conn.execute(sql, params).lastrowid
+
+
+def _executemany(conn, sql, seq_of_params):
+    return conn.executemany(sql, seq_of_params).rowcount
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(path=DATABASE):
+    """The process-wide writer for `path`, started on first use and drained at exit"""
+    with _writers_lock:
+        writer = _writers.get(path)
+        if writer is None:
+            writer = _writers[path] = DatabaseWriter(path).start()
+            atexit.register(writer.stop)
+        return writer
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+"""
+Wrong answer clusters
+تجميع الإجابات الخاطئة المتشابهة لكل سؤال (همزات، مسافات، حرف زائد) في مجموعات بعدد وممثل
+
+Tables (migration 9):
+
+- error_clusters: one row per cluster with its `key` (the
+  arabic_text.answer_bucket of the answer that opened it), the
+  `representative` answer shown to users (the most frequent raw answer
+  seen so far) and the total `count`;
+- error_cluster_members: which cluster each answer key belongs to, so
+  an answer seen before is assigned with one indexed lookup.
+
+A new key joins the most similar cluster of the question whose key is at
+least CLUSTER_THRESHOLD similar (LCS ratio from grading.py), otherwise it
+opens a new cluster. Counts are cumulative: archiving error_analysis rows
+(compaction.py) does not decrement them. Answers that turn out to be
+correct (regrade.py --prune-correct) are taken out with
+`remove_wrong_answer`.
+
+`rebuild_clusters` recomputes the clusters from error_analysis:
+    python error_clusters.py --rebuild [--db science_bot.db]
+"""
+
+import argparse
+import sys
+
+from arabic_text import answer_bucket
+from db import DATABASE, connect
+from grading import LcsSimilarity
+
+# مفتاحان في نفس المجموعة إذا تجاوز تشابههما هذه النسبة
+CLUSTER_THRESHOLD = 0.8
+# أقصى عدد من المجموعات (الأكثر تكراراً) يُقارن بها المفتاح الجديد
+MAX_COMPARED = 200
+
+_similarity = LcsSimilarity()
+
+
+def _closest_cluster(conn, question_id, key):
+    best_id, best_score = None, CLUSTER_THRESHOLD
+    for cluster_id, cluster_key in conn.execute('''
+    SELECT id, key FROM error_clusters
+    WHERE question_id = ?
+    ORDER BY count DESC LIMIT ?''', (question_id, MAX_COMPARED)).fetchall():
+        score = _similarity.score(key, cluster_key, best_score)
+        if score >= best_score:
+            best_id, best_score = cluster_id, score
+    return best_id
+
+
+def add_wrong_answer(conn, question_id, answer, answer_count=1, count=1):
+    """Add `count` occurrences of `answer` to its cluster; returns the cluster id.
+
+    `answer_count` is how often this exact answer has been seen (its
+    error_analysis count); it replaces the representative when higher.
+    Runs inside the caller's transaction.
+    """
+    key = answer_bucket(answer)
+    if not key:
+        return None
+
+    member = conn.execute('''
+    SELECT cluster_id FROM error_cluster_members
+    WHERE question_id = ? AND key = ?''', (question_id, key)).fetchone()
+    cluster_id = member[0] if member else _closest_cluster(conn, question_id, key)
+
+    if cluster_id is None:
+        cluster_id = conn.execute('''
+        INSERT INTO error_clusters (question_id, key, representative, representative_count, count)
+        VALUES (?, ?, ?, ?, ?)''', (question_id, key, answer, answer_count, count)).lastrowid
+    else:
+        conn.execute('''
+        UPDATE error_clusters
+        SET count = count + ?,
+            last_seen = CURRENT_TIMESTAMP,
+            representative = CASE WHEN ? > representative_count THEN ? ELSE representative END,
+            representative_count = MAX(representative_count, ?)
+        WHERE id = ?''', (count, answer_count, answer, answer_count, cluster_id))
+
+    if not member:
+        conn.execute('''
+        INSERT INTO error_cluster_members (question_id, key, cluster_id)
+        VALUES (?, ?, ?)''', (question_id, key, cluster_id))
+    return cluster_id
+
+
+def remove_wrong_answer(conn, question_id, answer, count=1):
+    """Take `count` occurrences of `answer` out of its cluster (caller's transaction).
+
+    Call it after the answer's error_analysis row is deleted. A cluster
+    whose count drops to zero is deleted; if `answer` was the
+    representative, the most frequent remaining answer of the cluster in
+    error_analysis replaces it, or the cluster is deleted when none is left.
+    """
+    key = answer_bucket(answer)
+    if not key:
+        return
+    member = conn.execute('''
+    SELECT cluster_id FROM error_cluster_members
+    WHERE question_id = ? AND key = ?''', (question_id, key)).fetchone()
+    if member is None:
+        return
+    cluster_id = member[0]
+
+    remaining, representative = conn.execute('''
+    UPDATE error_clusters SET count = count - ?
+    WHERE id = ?
+    RETURNING count, representative''', (count, cluster_id)).fetchone()
+    if remaining > 0 and representative != answer:
+        return
+    if remaining > 0:
+        # الممثل أصبح إجابة صحيحة: أكثر إجابة خاطئة متبقية في المجموعة تحل محله
+        keys = {k for (k,) in conn.execute('''
+        SELECT key FROM error_cluster_members
+        WHERE question_id = ? AND cluster_id = ?''', (question_id, cluster_id)).fetchall()}
+        candidates = [(n or 1, text) for text, n in conn.execute('''
+        SELECT wrong_answer, count FROM error_analysis
+        WHERE question_id = ?''', (question_id,)).fetchall() if text and answer_bucket(text) in keys]
+        if candidates:
+            best_count, best = max(candidates)
+            conn.execute('''
+            UPDATE error_clusters SET representative = ?, representative_count = ?
+            WHERE id = ?''', (best, best_count, cluster_id))
+            return
+
+    conn.execute('DELETE FROM error_cluster_members WHERE question_id = ? AND cluster_id = ?',
+                 (question_id, cluster_id))
+    conn.execute('DELETE FROM error_clusters WHERE id = ?', (cluster_id,))
+
+
+def rebuild_clusters(conn):
+    """Recompute all clusters from error_analysis (caller owns the transaction).
+
+    Answers are added most frequent first, so each cluster is opened by
+    (and represented by) its most common answer.
+    """
+    conn.execute('DELETE FROM error_cluster_members')
+    conn.execute('DELETE FROM error_clusters')
+    rows = conn.execute('''
+    SELECT question_id, wrong_answer, count
+    FROM error_analysis  -- full-scan: إعادة بناء كاملة
+    WHERE wrong_answer IS NOT NULL
+    ORDER BY question_id, count DESC, id''').fetchall()
+    for question_id, answer, count in rows:
+        add_wrong_answer(conn, question_id, answer, count or 1, count or 1)
+    return len(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=DATABASE)
+    parser.add_argument('--rebuild', action='store_true', help='recompute the clusters from error_analysis')
+    args = parser.parse_args()
+
+    if not args.rebuild:
+        parser.print_help()
+        return 0
+
+    conn = connect(args.db)
+    try:
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            answers = rebuild_clusters(conn)
+        clusters = conn.execute('''
+        SELECT COUNT(*) FROM error_clusters  -- full-scan: ملخص بعد إعادة البناء
+        ''').fetchone()[0]
+        print(f"✅ Clusters rebuilt: {answers} answers in {clusters} clusters")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+"""
+Answer grading
+تقييم إجابات المستخدم (اختيار من متعدد، كلمات مفتاحية، تشابه نصي)
+"""
+
+import os
+from collections import Counter
+from difflib import SequenceMatcher
+
+# الإجابة النصية مقبولة إذا تجاوز التشابه هذه النسبة
+SIMILARITY_THRESHOLD = 60
+# إجابة الكلمات المفتاحية مقبولة إذا وصلت نسبة الكلمات المطابقة لهذه النسبة
+KEYWORDS_THRESHOLD = 70
+# الحد الأقصى لطول الإجابة التي تتم مقارنتها (الباقي يُهمل)
+MAX_ANSWER_CHARS = 1000
+
+
+def _length_bound(answer, reference):
+    """Upper bound of 2*M/(|a|+|b|) for any matching M: 2*min/(|a|+|b|)"""
+    total = len(answer) + len(reference)
+    return 2 * min(len(answer), len(reference)) / total if total else 1.0
+
+
+class SequenceMatcherSimilarity:
+    """The original difflib ratio; quadratic in the worst case"""
+
+    name = 'sequence_matcher'
+
+    def score(self, answer, reference, threshold=None):
+        return SequenceMatcher(None, answer, reference).ratio()
+
+
+class NgramSimilarity:
+    """Dice coefficient over character n-grams, linear in the input length"""
+
+    name = 'ngram'
+
+    def __init__(self, n=2, max_chars=MAX_ANSWER_CHARS):
+        self.n = n
+        self.max_chars = max_chars
+
+    def _grams(self, text):
+        n = self.n
+        return Counter(text[i:i + n] for i in range(max(len(text) - n + 1, 1)))
+
+    def score(self, answer, reference, threshold=None):
+        answer = answer[:self.max_chars]
+        bound = _length_bound(answer, reference)
+        if threshold is not None and bound < threshold:
+            return bound
+        a, b = self._grams(answer), self._grams(reference)
+        total = sum(a.values()) + sum(b.values())
+        return 2 * sum((a & b).values()) / total if total else 1.0
+
+
+class LcsSimilarity:
+    """2*LCS/(|a|+|b|) with a bit-parallel LCS (one big-int step per character).
+
+    Closest to SequenceMatcher's ratio while costing O(|a|) integer
+    operations on |reference|-bit numbers. Before the LCS we check two
+    cheap upper bounds (lengths, then the character multiset); when either
+    is already below `threshold` that bound is returned, which is enough
+    to reject the answer.
+    """
+
+    name = 'lcs'
+
+    def __init__(self, max_chars=MAX_ANSWER_CHARS):
+        self.max_chars = max_chars
+
+    def score(self, answer, reference, threshold=None):
+        answer = answer[:self.max_chars]
+        if not answer or not reference:
+            return 1.0 if answer == reference else 0.0
+
+        total = len(answer) + len(reference)
+        if threshold is not None:
+            bound = _length_bound(answer, reference)
+            if bound < threshold:
+                return bound
+            bound = 2 * sum((Counter(answer) & Counter(reference)).values()) / total
+            if bound < threshold:
+                return bound
+
+        masks = {}
+        for i, ch in enumerate(reference):
+            masks[ch] = masks.get(ch, 0) | (1 << i)
+        full = (1 << len(reference)) - 1
+        v = full
+        for ch in answer:
+            u = v & masks.get(ch, 0)
+            v = ((v + u) | (v - u)) & full
+        lcs = len(reference) - bin(v).count('1')
+        return 2 * lcs / total
+
+
+SIMILARITY_ENGINES = {
+    engine.name: engine for engine in (SequenceMatcherSimilarity, NgramSimilarity, LcsSimilarity)
+}
+
+
+def get_similarity_engine(name=None):
+    """Build the engine named by `name` or the ANSWER_SIMILARITY_ENGINE env var"""
+    name = name or os.getenv('ANSWER_SIMILARITY_ENGINE', LcsSimilarity.name)
+    if name not in SIMILARITY_ENGINES:
+        raise ValueError(f"Unknown similarity engine: {name}")
+    return SIMILARITY_ENGINES[name]()
+
+
+similarity_engine = get_similarity_engine()
+
+
+def grade_answer(q, normalized, user_answer, similarity=None, exact=True):
+    """Grade an already normalized user answer.
+
+    Returns (kind, is_correct, accuracy_percentage) where kind is 'mcq',
+    'keywords', 'similarity' or None when the question has no reference.
+    The accuracy is exact by default. Callers that only need `is_correct`
+    pass exact=False to let the engine stop early; the accuracy of a
+    rejected similarity answer is then only an upper bound.
+    """
+    if q['type'] == 'mcq':
+        is_correct = user_answer in normalized['correct_answers']
+        return 'mcq', is_correct, 100 if is_correct else 0
+
+    if 'answer_keywords' in q:
+        required_keywords = normalized['keywords']
+        matched_keywords = normalized['keyword_matcher'].find(user_answer)
+        accuracy = (len(matched_keywords) / len(required_keywords)) * 100
+        return 'keywords', accuracy >= KEYWORDS_THRESHOLD, accuracy
+
+    if 'answer' in q:
+        engine = similarity or similarity_engine
+        # النسبة تُعرض للمستخدم وتُحفظ وتحدد جودة المراجعة: الحد الأعلى لا يكفي إلا للقرار
+        threshold = None if exact else SIMILARITY_THRESHOLD / 100
+        accuracy = engine.score(user_answer, normalized['answer'], threshold) * 100
+        return 'similarity', accuracy > SIMILARITY_THRESHOLD, accuracy
+
+    return None, False, 0
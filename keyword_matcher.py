@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+
+"""
+Keyword matcher
+مطابقة جميع الكلمات المفتاحية في مرور واحد على الإجابة (Aho–Corasick)
+"""
+
+from collections import deque
+
+# السوابق المسموح بها قبل الكلمة المفتاحية (و، ف، ب، ل، ك، ال ومركباتها)
+CLITIC_PREFIXES = frozenset((
+    'و', 'ف', 'ب', 'ل', 'ك',
+    'ال', 'وال', 'فال', 'بال', 'كال', 'لل', 'ولل', 'فلل',
+    'وب', 'ول', 'فب', 'فل', 'وك',
+))
+MAX_PREFIX_LEN = max(len(p) for p in CLITIC_PREFIXES)
+
+
+class KeywordMatcher:
+    """Aho–Corasick automaton over a question's normalized keywords.
+
+    `find` scans the answer once and returns the indices of the keywords it
+    contains. With `word_boundary` a keyword only counts when it starts a
+    word, or follows one of `prefixes` at the start of a word (so "الرخو"
+    and "والرخو" match "رخو" but "مرخو" does not); the keyword may still
+    be followed by a suffix. Without it every substring occurrence counts,
+    like the old `kw in answer` check.
+    """
+
+    def __init__(self, keywords, word_boundary=True, prefixes=CLITIC_PREFIXES):
+        self.keywords = list(keywords)
+        self.word_boundary = word_boundary
+        self.prefixes = prefixes
+        self.always = [i for i, kw in enumerate(self.keywords) if not kw]
+
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        for i, kw in enumerate(self.keywords):
+            if not kw:
+                continue
+            node = 0
+            for ch in kw:
+                nxt = self.goto[node].get(ch)
+                if nxt is None:
+                    nxt = len(self.goto)
+                    self.goto[node][ch] = nxt
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                node = nxt
+            self.output[node].append(i)
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.output[nxt] = self.output[nxt] + self.output[self.fail[nxt]]
+
+    def to_state(self):
+        """The automaton as plain containers (for the compiled question bank)"""
+        return {
+            'keywords': self.keywords,
+            'word_boundary': self.word_boundary,
+            'prefixes': self.prefixes,
+            'goto': self.goto,
+            'fail': self.fail,
+            'output': self.output,
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        matcher = cls.__new__(cls)
+        matcher.keywords = state['keywords']
+        matcher.word_boundary = state['word_boundary']
+        matcher.prefixes = state['prefixes']
+        matcher.always = [i for i, kw in enumerate(matcher.keywords) if not kw]
+        matcher.goto = state['goto']
+        matcher.fail = state['fail']
+        matcher.output = state['output']
+        return matcher
+
+    def _starts_word(self, text, start):
+        if start == 0 or not text[start - 1].isalnum():
+            return True
+        for k in range(1, min(MAX_PREFIX_LEN, start) + 1):
+            begin = start - k
+            if text[begin:start] in self.prefixes and (begin == 0 or not text[begin - 1].isalnum()):
+                return True
+        return False
+
+    def find(self, text):
+        """Return the set of keyword indices found in `text`"""
+        found = set(self.always)
+        remaining = len(self.keywords) - len(found)
+        node = 0
+        for pos, ch in enumerate(text):
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+            for i in self.output[node]:
+                if i in found:
+                    continue
+                if not self.word_boundary or self._starts_word(text, pos - len(self.keywords[i]) + 1):
+                    found.add(i)
+                    remaining -= 1
+            if not remaining:
+                break
+        return found
@@ -0,0 +1,521 @@
+# -*- coding: utf-8 -*-
+
+"""
+Schema migrations
+ترحيلات مخطط قاعدة البيانات بأرقام إصدارات (PRAGMA user_version)
+
+Each migration is a function `fn(conn)` registered in MIGRATIONS with its
+version. `migrate` applies the ones above the database's user_version in
+order, each in its own transaction together with the new user_version,
+so a failed migration leaves the database at the previous version.
+
+Usage:
+    python migrations.py [--db science_bot.db] [--status]
+"""
+
+import argparse
+import sys
+
+from db import DATABASE, connect
+from error_clusters import rebuild_clusters
+from stats_rollups import PERIODS, backfill
+
+
+def _v1_initial_schema(conn):
+    """The tables init_db used to create (IF NOT EXISTS: existing databases start at version 0)"""
+    # إنشاء الجداول الأساسية
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        chat_id INTEGER PRIMARY KEY,
+        register_date TEXT NOT NULL,
+        last_active TEXT NOT NULL,
+        score INTEGER DEFAULT 0,
+        attempts INTEGER DEFAULT 0,
+        selected_subject TEXT,  -- المادة المختارة
+        selected_topic TEXT
+    )''')
+
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS questions (
+        id TEXT PRIMARY KEY,
+        question TEXT NOT NULL,
+        topic TEXT,
+        page TEXT,
+        type TEXT NOT NULL,
+        choices TEXT,
+        correct_indices TEXT,
+        answer TEXT,
+        answer_keywords TEXT,
+        explanation TEXT,
+        hint TEXT,
+        reference TEXT,
+        difficulty INTEGER DEFAULT 1
+    )''')
+
+    # جدول الدعوات
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS user_invites (
+        chat_id INTEGER,
+        invite_code TEXT PRIMARY KEY,
+        created_at TEXT NOT NULL,
+        uses INTEGER DEFAULT 0,
+        FOREIGN KEY (chat_id) REFERENCES users (chat_id)
+    )''')
+
+    # جدول الملاحظات
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS user_feedback (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id INTEGER,
+        feedback_text TEXT NOT NULL,
+        rating INTEGER,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (chat_id) REFERENCES users (chat_id)
+    )''')
+
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS user_answered (
+        chat_id INTEGER,
+        question_id TEXT,
+        PRIMARY KEY (chat_id, question_id),
+        FOREIGN KEY (chat_id) REFERENCES users (chat_id)
+    )''')
+
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS user_topics (
+        chat_id INTEGER,
+        topic TEXT,
+        correct INTEGER DEFAULT 0,
+        attempts INTEGER DEFAULT 0,
+        PRIMARY KEY (chat_id, topic)
+    )''')
+
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS hard_questions (
+        chat_id INTEGER,
+        question_id TEXT,
+        PRIMARY KEY (chat_id, question_id)
+    )''')
+
+    # جدول جلسات المستخدم
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS user_sessions (
+        session_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id INTEGER,
+        start_time TEXT,
+        end_time TEXT,
+        questions_answered INTEGER,
+        FOREIGN KEY (chat_id) REFERENCES users (chat_id)
+    )''')
+
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS user_mistakes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id INTEGER,
+        question_id TEXT,
+        wrong_answer TEXT,
+        count INTEGER DEFAULT 1,
+        accuracy REAL,
+        last_updated TEXT DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (chat_id) REFERENCES users (chat_id),
+        UNIQUE(chat_id, question_id, wrong_answer)
+    )''')
+
+    # جدول تحليل الأخطاء
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS error_analysis (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        question_id TEXT,
+        wrong_answer TEXT,
+        count INTEGER DEFAULT 1,
+        common_mistakes TEXT,
+        FOREIGN KEY (question_id) REFERENCES questions (id)
+    )''')
+
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_users_chat_id ON users (chat_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_user_topics_chat_id ON user_topics (chat_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_chat_id ON user_sessions (chat_id)')
+
+
+def _v2_query_indexes(conn):
+    """Indexes behind the bot's and the dashboard's queries (see check_query_plans.py)"""
+    # فهارس مكررة: chat_id هو المفتاح الأساسي، و(chat_id, topic) يغطي chat_id
+    conn.execute('DROP INDEX IF EXISTS idx_users_chat_id')
+    conn.execute('DROP INDEX IF EXISTS idx_user_topics_chat_id')
+
+    # البحث عن خطأ سابق وأكثر الأخطاء تكراراً لكل سؤال
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_error_analysis_question ON error_analysis (question_id, wrong_answer)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_error_analysis_count ON error_analysis (count)')
+
+    # إحصائيات النشاط والتسجيل
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_users_last_active ON users (last_active)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_users_register_date ON users (register_date)')
+
+    # الجلسات حسب الوقت (يغطي SUM(questions_answered)) والجلسات المفتوحة
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_start_time ON user_sessions (start_time, questions_answered)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_sessions_end_time ON user_sessions (end_time, start_time)')
+
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_feedback_created_at ON user_feedback (created_at)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_feedback_chat_id ON user_feedback (chat_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_invites_chat_id ON user_invites (chat_id, uses)')
+
+    # إحصائيات كل سؤال في لوحة التحكم
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_user_answered_question ON user_answered (question_id, chat_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_user_mistakes_question ON user_mistakes (question_id, chat_id)')
+
+
+def _v3_question_ratings(conn):
+    """record_question_rating inserts into question_ratings, which was never created"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS question_ratings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        chat_id INTEGER,
+        question_id TEXT,
+        rating TEXT NOT NULL,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (chat_id) REFERENCES users (chat_id)
+    )''')
+
+
+def _v4_error_analysis_unique(conn):
+    """Merge duplicate (question_id, wrong_answer) rows, then make the pair unique"""
+    # الصف الأقدم يحتفظ بمجموع التكرارات وتُحذف البقية
+    conn.execute('''
+    UPDATE error_analysis
+    SET count = (
+        SELECT SUM(COALESCE(e.count, 1)) FROM error_analysis e
+        WHERE e.question_id = error_analysis.question_id
+          AND e.wrong_answer = error_analysis.wrong_answer
+    )
+    WHERE id IN (
+        SELECT MIN(id) FROM error_analysis
+        WHERE question_id IS NOT NULL AND wrong_answer IS NOT NULL
+        GROUP BY question_id, wrong_answer
+        HAVING COUNT(*) > 1
+    )''')
+    conn.execute('''
+    DELETE FROM error_analysis
+    WHERE question_id IS NOT NULL AND wrong_answer IS NOT NULL
+      AND id NOT IN (
+        SELECT MIN(id) FROM error_analysis
+        WHERE question_id IS NOT NULL AND wrong_answer IS NOT NULL
+        GROUP BY question_id, wrong_answer
+    )''')
+
+    conn.execute('DROP INDEX IF EXISTS idx_error_analysis_question')
+    conn.execute('CREATE UNIQUE INDEX idx_error_analysis_question ON error_analysis (question_id, wrong_answer)')
+
+
+def _upsert(table, key, key_expr, **deltas):
+    """INSERT ... ON CONFLICT that adds `deltas` to the row `key_expr` of a rollup table"""
+    columns = ', '.join(deltas)
+    values = ', '.join(deltas.values())
+    updates = ', '.join(f'{column} = {column} + excluded.{column}' for column in deltas)
+    return (f'INSERT INTO {table} ({key}, {columns}) VALUES ({key_expr}, {values}) '
+            f'ON CONFLICT({key}) DO UPDATE SET {updates};')
+
+
+def _v5_stats_rollups(conn):
+    """Rollup tables for the stats handlers, kept current by triggers (see stats_rollups.py)"""
+    for table, key, _ in PERIODS:
+        conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS {table} (
+            {key} TEXT PRIMARY KEY,
+            new_users INTEGER NOT NULL DEFAULT 0,
+            active_users INTEGER NOT NULL DEFAULT 0,
+            sessions INTEGER NOT NULL DEFAULT 0,
+            finished_sessions INTEGER NOT NULL DEFAULT 0,
+            session_minutes REAL NOT NULL DEFAULT 0,
+            questions_answered INTEGER NOT NULL DEFAULT 0
+        )''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS stats_hourly (
+        hour TEXT PRIMARY KEY,
+        sessions INTEGER NOT NULL DEFAULT 0,
+        questions_answered INTEGER NOT NULL DEFAULT 0
+    )''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS stats_topics (
+        topic TEXT PRIMARY KEY,
+        users INTEGER NOT NULL DEFAULT 0
+    )''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS stats_totals (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        users INTEGER NOT NULL DEFAULT 0,
+        score INTEGER NOT NULL DEFAULT 0,
+        attempts INTEGER NOT NULL DEFAULT 0
+    )''')
+
+    def periods(column, **deltas):
+        return '\n'.join(_upsert(table, key, period.format(column), **deltas) for table, key, period in PERIODS)
+
+    hour = "strftime('%H', NEW.start_time)"
+    answered = 'COALESCE(NEW.questions_answered, 0)'
+    minutes = '(julianday(NEW.end_time) - julianday(NEW.start_time)) * 24 * 60'
+
+    # مستخدم جديد: يوم التسجيل ويوم النشاط
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_stats_users_insert AFTER INSERT ON users
+    BEGIN
+        {periods('NEW.register_date', new_users='1')}
+        {periods('NEW.last_active', active_users='1')}
+        UPDATE stats_totals SET users = users + 1,
+            score = score + COALESCE(NEW.score, 0), attempts = attempts + COALESCE(NEW.attempts, 0);
+    END''')
+
+    # أول نشاط للمستخدم في يوم (أو شهر) جديد
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_stats_users_active AFTER UPDATE OF last_active ON users
+    WHEN date(NEW.last_active) > date(OLD.last_active)
+    BEGIN
+        {_upsert('stats_daily', 'day', 'date(NEW.last_active)', active_users='1')}
+        INSERT INTO stats_monthly (month, active_users)
+        SELECT strftime('%Y-%m', NEW.last_active), 1
+        WHERE strftime('%Y-%m', NEW.last_active) > strftime('%Y-%m', OLD.last_active)
+        ON CONFLICT(month) DO UPDATE SET active_users = active_users + 1;
+    END''')
+
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_stats_users_score AFTER UPDATE OF score, attempts ON users
+    BEGIN
+        UPDATE stats_totals SET
+            score = score + COALESCE(NEW.score, 0) - COALESCE(OLD.score, 0),
+            attempts = attempts + COALESCE(NEW.attempts, 0) - COALESCE(OLD.attempts, 0);
+    END''')
+
+    conn.execute('''
+    CREATE TRIGGER IF NOT EXISTS trg_stats_users_topic AFTER UPDATE OF selected_topic ON users
+    WHEN NEW.selected_topic IS NOT OLD.selected_topic
+    BEGIN
+        UPDATE stats_topics SET users = users - 1 WHERE topic = OLD.selected_topic;
+        INSERT INTO stats_topics (topic, users)
+        SELECT NEW.selected_topic, 1 WHERE NEW.selected_topic IS NOT NULL
+        ON CONFLICT(topic) DO UPDATE SET users = users + 1;
+    END''')
+
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_stats_sessions_insert AFTER INSERT ON user_sessions
+    WHEN NEW.start_time IS NOT NULL
+    BEGIN
+        {periods('NEW.start_time', sessions='1', questions_answered=answered)}
+        {_upsert('stats_hourly', 'hour', hour, sessions='1', questions_answered=answered)}
+    END''')
+
+    delta = f'{answered} - COALESCE(OLD.questions_answered, 0)'
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_stats_sessions_answered AFTER UPDATE OF questions_answered ON user_sessions
+    WHEN NEW.start_time IS NOT NULL
+    BEGIN
+        {periods('NEW.start_time', questions_answered=delta)}
+        {_upsert('stats_hourly', 'hour', hour, questions_answered=delta)}
+    END''')
+
+    conn.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS trg_stats_sessions_end AFTER UPDATE OF end_time ON user_sessions
+    WHEN OLD.end_time IS NULL AND NEW.end_time IS NOT NULL AND NEW.start_time IS NOT NULL
+    BEGIN
+        {periods('NEW.start_time', finished_sessions='1', session_minutes=minutes)}
+    END''')
+
+    backfill(conn)
+
+
+def _v6_question_sync(conn):
+    """Columns for syncing the JSON bank into questions (see question_sync.py)"""
+    conn.execute('ALTER TABLE questions ADD COLUMN subject TEXT')
+    conn.execute('ALTER TABLE questions ADD COLUMN ordinal INTEGER')
+    conn.execute('ALTER TABLE questions ADD COLUMN content_hash TEXT')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS sync_state (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )''')
+
+
+def _v7_answered_bits(conn):
+    """One answered-questions bitmap per user (rows are moved by answered_bits.convert_user_answered)"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS user_answered_bits (
+        chat_id INTEGER PRIMARY KEY,
+        bits BLOB NOT NULL
+    )''')
+    # عدد المستخدمين الذين أجابوا كل سؤال (بدلاً من COUNT(DISTINCT) على user_answered)
+    conn.execute('ALTER TABLE questions ADD COLUMN answered_users INTEGER NOT NULL DEFAULT 0')
+    # clear_answered ينقص answered_users بترتيب الأسئلة
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_questions_ordinal ON questions (ordinal)')
+
+
+def _v8_compaction(conn):
+    """Timestamps and indexes used by the nightly compaction job (see compaction.py)"""
+    conn.execute('ALTER TABLE error_analysis ADD COLUMN last_seen TEXT')
+    # لا نعرف متى سُجلت الصفوف القديمة؛ نعتبرها حديثة حتى لا تُؤرشف فوراً
+    conn.execute('UPDATE error_analysis SET last_seen = CURRENT_TIMESTAMP')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_error_analysis_last_seen ON error_analysis (last_seen)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_user_mistakes_last_updated ON user_mistakes (last_updated)')
+
+    # مفتاح تجميع الإجابات المتقاربة (arabic_text.answer_bucket) بجانب نص الإجابة الأصلي
+    conn.execute('ALTER TABLE user_mistakes ADD COLUMN answer_key TEXT')
+    conn.execute('ALTER TABLE error_analysis ADD COLUMN answer_key TEXT')
+    conn.execute('''
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_user_mistakes_answer_key
+    ON user_mistakes (chat_id, question_id, answer_key) WHERE answer_key IS NOT NULL''')
+    conn.execute('''
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_error_analysis_answer_key
+    ON error_analysis (question_id, answer_key) WHERE answer_key IS NOT NULL''')
+
+
+def _v9_error_clusters(conn):
+    """Clusters of similar wrong answers per question (see error_clusters.py)"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS error_clusters (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        question_id TEXT NOT NULL,
+        key TEXT NOT NULL,
+        representative TEXT NOT NULL,
+        representative_count INTEGER NOT NULL DEFAULT 1,
+        count INTEGER NOT NULL DEFAULT 0,
+        last_seen TEXT DEFAULT CURRENT_TIMESTAMP
+    )''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS error_cluster_members (
+        question_id TEXT NOT NULL,
+        key TEXT NOT NULL,
+        cluster_id INTEGER NOT NULL REFERENCES error_clusters (id),
+        PRIMARY KEY (question_id, key)
+    )''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_error_clusters_question ON error_clusters (question_id, count)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_error_clusters_count ON error_clusters (count)')
+
+    rebuild_clusters(conn)
+
+
+def _v10_calibration(conn):
+    """Per-question answer statistics and calibrated difficulty (see calibration.py)"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS question_calibration (
+        question_id TEXT PRIMARY KEY,
+        n INTEGER NOT NULL DEFAULT 0,
+        correct INTEGER NOT NULL DEFAULT 0,
+        sum_t REAL NOT NULL DEFAULT 0,
+        sum_t2 REAL NOT NULL DEFAULT 0,
+        sum_correct_t REAL NOT NULL DEFAULT 0,
+        dirty INTEGER NOT NULL DEFAULT 1
+    )''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_question_calibration_dirty ON question_calibration (dirty) WHERE dirty = 1')
+    conn.execute('ALTER TABLE questions ADD COLUMN p_value REAL')
+    conn.execute('ALTER TABLE questions ADD COLUMN discrimination REAL')
+
+
+def _v11_review_schedule(conn):
+    """Spaced-repetition schedule of missed and hard questions (see spaced_repetition.py)"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS review_schedule (
+        chat_id INTEGER NOT NULL,
+        question_id TEXT NOT NULL,
+        due INTEGER NOT NULL,
+        interval INTEGER NOT NULL,
+        ease INTEGER NOT NULL,
+        repetitions INTEGER NOT NULL,
+        PRIMARY KEY (chat_id, question_id)
+    ) WITHOUT ROWID''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_review_schedule_user ON review_schedule (chat_id, due)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_review_schedule_due ON review_schedule (due, chat_id)')
+    # الأسئلة التي قيّمها المستخدمون صعبة تُجدول للمراجعة غداً
+    conn.execute('''
+    INSERT OR IGNORE INTO review_schedule (chat_id, question_id, due, interval, ease, repetitions)
+    SELECT chat_id, question_id, CAST(strftime('%s', 'now') AS INTEGER) + 86400, 1, 250, 0
+    FROM hard_questions''')
+
+
+def _v12_active_questions(conn):
+    """Active question per chat, written through by session_store.SessionStore"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS active_questions (
+        chat_id INTEGER PRIMARY KEY,
+        question_id TEXT NOT NULL,
+        bank_version INTEGER NOT NULL,
+        expires_at INTEGER NOT NULL
+    )''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_active_questions_expires ON active_questions (expires_at)')
+
+
+def _v13_mcq_taps(conn):
+    """Graded MCQ buttons (callback_codec.claim_tap), so a message cannot be tapped twice"""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS mcq_taps (
+        chat_id INTEGER NOT NULL,
+        ordinal INTEGER NOT NULL,
+        issued INTEGER NOT NULL,
+        PRIMARY KEY (chat_id, ordinal, issued)
+    ) WITHOUT ROWID''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_mcq_taps_issued ON mcq_taps (issued)')
+
+
+# (الإصدار، الوصف، الدالة) — يُضاف كل ترحيل جديد في آخر القائمة برقم أكبر
+MIGRATIONS = [
+    (1, 'initial schema', _v1_initial_schema),
+    (2, 'indexes for hot queries', _v2_query_indexes),
+    (3, 'question_ratings table', _v3_question_ratings),
+    (4, 'unique error_analysis (question_id, wrong_answer)', _v4_error_analysis_unique),
+    (5, 'statistics rollup tables', _v5_stats_rollups),
+    (6, 'question bank sync columns', _v6_question_sync),
+    (7, 'answered questions bitmap', _v7_answered_bits),
+    (8, 'mistake tables compaction', _v8_compaction),
+    (9, 'wrong answer clusters', _v9_error_clusters),
+    (10, 'question difficulty calibration', _v10_calibration),
+    (11, 'spaced repetition schedule', _v11_review_schedule),
+    (12, 'active question sessions', _v12_active_questions),
+    (13, 'graded MCQ buttons', _v13_mcq_taps),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn, target=LATEST_VERSION):
+    """Apply pending migrations up to `target`; returns the list of applied versions"""
+    current = schema_version(conn)
+    if current > LATEST_VERSION:
+        print(f"⚠️ قاعدة البيانات بإصدار {current} أحدث من الكود ({LATEST_VERSION})")
+        return []
+
+    applied = []
+    for version, description, fn in MIGRATIONS:
+        if version <= current or version > target:
+            continue
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            fn(conn)
+            conn.execute(f'PRAGMA user_version = {version}')
+        applied.append(version)
+        print(f"✅ ترحيل قاعدة البيانات {version}: {description}")
+    return applied
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=DATABASE)
+    parser.add_argument('--status', action='store_true', help='show the versions without migrating')
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    try:
+        current = schema_version(conn)
+        if args.status:
+            for version, description, _ in MIGRATIONS:
+                mark = 'x' if version <= current else ' '
+                print(f"[{mark}] {version}: {description}")
+            return 0
+        if not migrate(conn):
+            print(f"Schema is up to date (version {current})")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
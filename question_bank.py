@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+
+"""
+Question bank
+فهرسة الأسئلة في الذاكرة بدلاً من البحث الخطي في القائمة
+"""
+
+import hashlib
+import json
+import marshal
+import os
+import struct
+import threading
+from array import array
+from collections import OrderedDict
+
+from arabic_text import preprocess_arabic
+from keyword_matcher import KeywordMatcher
+
+DEFAULT_SUBJECT = 'العلوم'
+DEFAULT_TOPIC = 'عام'
+
+# ملفات الأسئلة مع بادئة المعرفات لكل ملف
+# (معرفات new.json تتكرر مع questions_full.json لذلك تُميَّز ببادئة)
+QUESTION_SOURCES = (
+    ('questions_full.json', ''),
+    ('new.json', 'new_'),
+)
+
+# الملف المجمّع الناتج عن compile_bank.py
+BANK_ARTIFACT = 'questions.bank'
+ARTIFACT_MAGIC = b'QBANK3\n'
+
+
+def load_questions(sources=QUESTION_SOURCES):
+    """Read and merge the JSON banks, prefixing ids per source"""
+    questions = []
+    for path, prefix in sources:
+        if not os.path.exists(path):
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            for q in json.load(f):
+                if prefix:
+                    q = dict(q, id=prefix + q['id'])
+                questions.append(q)
+    return questions
+
+
+def normalize_question(q):
+    """Precompute the normalized strings (and keyword automaton) used when grading a question"""
+    choices = [preprocess_arabic(c) for c in q.get('choices', [])]
+    keywords = [preprocess_arabic(kw) for kw in q.get('answer_keywords', [])]
+    return {
+        'choices': choices,
+        'correct_answers': [choices[i] for i in q.get('correct_indices', []) if i < len(choices)],
+        'keywords': keywords,
+        'keyword_matcher': KeywordMatcher(keywords) if keywords else None,
+        'answer': preprocess_arabic(q['answer']) if 'answer' in q else None,
+    }
+
+
+class QuestionBank:
+    """In-memory question bank indexed by id, subject and topic.
+
+    Every question gets an ordinal; the secondary indexes hold compact
+    arrays of ordinals. Passing the `ordinals` of a previous bank keeps
+    existing questions on the same ordinal, so per-user answered sets stay
+    valid across reloads. New questions get ordinals from `next_ordinal`
+    up, so the ordinal of a removed question is never reused.
+    """
+
+    def __init__(self, questions, version=1, ordinals=None, normalized=None, next_ordinal=0):
+        self.version = version
+        self.questions = list(questions)
+        self.by_id = {}
+        self.ordinals = {}
+        self.normalized = {}
+        self.by_subject = {}
+        self.by_topic = {}
+        self.by_subject_topic = {}
+
+        known = ordinals or {}
+        next_ordinal = max(max(known.values(), default=-1) + 1, next_ordinal)
+        for q in self.questions:
+            ordinal = known.get(q['id'])
+            if ordinal is None:
+                ordinal = next_ordinal
+                next_ordinal += 1
+            self.by_id[q['id']] = q
+            self.ordinals[q['id']] = ordinal
+            cached = normalized.get(q['id']) if normalized else None
+            self.normalized[q['id']] = cached or normalize_question(q)
+
+        self.next_ordinal = next_ordinal
+        self.by_ordinal = [None] * next_ordinal
+        for q in self.questions:
+            ordinal = self.ordinals[q['id']]
+            subject = q.get('subject', DEFAULT_SUBJECT)
+            topic = q.get('topic', DEFAULT_TOPIC)
+            self.by_ordinal[ordinal] = q
+            self.by_subject.setdefault(subject, array('i')).append(ordinal)
+            self.by_topic.setdefault(topic, array('i')).append(ordinal)
+            self.by_subject_topic.setdefault((subject, topic), array('i')).append(ordinal)
+        self.all_ordinals = array('i', (self.ordinals[q['id']] for q in self.questions))
+
+    def to_state(self):
+        """Everything needed to rebuild the bank without parsing or normalizing, as plain containers"""
+        return {
+            'questions': self.questions,
+            'ordinals': self.ordinals,
+            'next_ordinal': self.next_ordinal,
+            'normalized': {q_id: _normalized_to_state(n) for q_id, n in self.normalized.items()},
+            'by_subject': {k: v.tobytes() for k, v in self.by_subject.items()},
+            'by_topic': {k: v.tobytes() for k, v in self.by_topic.items()},
+            'by_subject_topic': {k: v.tobytes() for k, v in self.by_subject_topic.items()},
+        }
+
+    @classmethod
+    def from_state(cls, state, version=1, next_ordinal=0):
+        bank = cls.__new__(cls)
+        bank.version = version
+        bank.questions = state['questions']
+        bank.ordinals = state['ordinals']
+        bank.normalized = _normalized_from_states(state['normalized'])
+        bank.by_subject = {k: _ordinal_array(v) for k, v in state['by_subject'].items()}
+        bank.by_topic = {k: _ordinal_array(v) for k, v in state['by_topic'].items()}
+        bank.by_subject_topic = {k: _ordinal_array(v) for k, v in state['by_subject_topic'].items()}
+        bank.by_id = {q['id']: q for q in bank.questions}
+        bank.next_ordinal = max(max(bank.ordinals.values(), default=-1) + 1, state.get('next_ordinal', 0), next_ordinal)
+        bank.by_ordinal = [None] * bank.next_ordinal
+        for q in bank.questions:
+            bank.by_ordinal[bank.ordinals[q['id']]] = q
+        bank.all_ordinals = array('i', (bank.ordinals[q['id']] for q in bank.questions))
+        return bank
+
+    def __len__(self):
+        return len(self.questions)
+
+    def __contains__(self, q_id):
+        return q_id in self.by_id
+
+    def get(self, q_id):
+        return self.by_id.get(q_id)
+
+    def ordinal(self, q_id):
+        return self.ordinals.get(q_id)
+
+    def at(self, ordinal):
+        """The question with this ordinal, or None"""
+        return self.by_ordinal[ordinal] if 0 <= ordinal < len(self.by_ordinal) else None
+
+    def pool(self, subject=None, topic=None):
+        """Return the ordinals matching the subject/topic (None means any)"""
+        if subject is None and topic is None:
+            return self.all_ordinals
+        if subject is None:
+            return self.by_topic.get(topic, ())
+        if topic is None:
+            return self.by_subject.get(subject, ())
+        return self.by_subject_topic.get((subject, topic), ())
+
+
+def _normalized_to_state(normalized):
+    matcher = normalized['keyword_matcher']
+    return dict(normalized, keyword_matcher=matcher.to_state() if matcher else None)
+
+
+def _normalized_from_states(states):
+    return {
+        q_id: dict(n, keyword_matcher=KeywordMatcher.from_state(n['keyword_matcher']) if n['keyword_matcher'] else None)
+        for q_id, n in states.items()
+    }
+
+
+def _ordinal_array(data):
+    ordinals = array('i')
+    ordinals.frombytes(data)
+    return ordinals
+
+
+def source_fingerprint(sources=QUESTION_SOURCES):
+    """(path, prefix, size, mtime) of each source file, used to detect a stale artifact"""
+    fingerprint = []
+    for path, prefix in sources:
+        if os.path.exists(path):
+            st = os.stat(path)
+            fingerprint.append([path, prefix, st.st_size, st.st_mtime_ns])
+        else:
+            fingerprint.append([path, prefix, None, None])
+    return fingerprint
+
+
+def write_artifact(bank, path=BANK_ARTIFACT, sources=QUESTION_SOURCES):
+    """Write the compiled bank: magic, header length, JSON header, marshalled state.
+
+    The state holds only plain containers (dicts, lists, strings, numbers,
+    bytes), so loading it never runs code the way unpickling can. The
+    header records the payload's SHA-256 and the marshal format version;
+    a corrupt artifact or one written by another Python is not loaded.
+    """
+    payload = marshal.dumps(bank.to_state())
+    header = json.dumps({
+        'sources': source_fingerprint(sources),
+        'count': len(bank),
+        'marshal_version': marshal.version,
+        'sha256': hashlib.sha256(payload).hexdigest(),
+    }).encode('utf-8')
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(ARTIFACT_MAGIC)
+        f.write(struct.pack('<I', len(header)))
+        f.write(header)
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+def read_artifact(path=BANK_ARTIFACT, sources=QUESTION_SOURCES):
+    """Return the compiled bank state, or None if the artifact is missing or stale"""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:len(ARTIFACT_MAGIC)] != ARTIFACT_MAGIC:
+        print(f"⚠️ ملف {path} غير صالح، سيتم استخدام ملفات JSON")
+        return None
+    offset = len(ARTIFACT_MAGIC)
+    (header_len,) = struct.unpack_from('<I', data, offset)
+    offset += 4
+    header = json.loads(data[offset:offset + header_len].decode('utf-8'))
+    if header['sources'] != source_fingerprint(sources):
+        print(f"⚠️ ملف {path} قديم، سيتم استخدام ملفات JSON")
+        return None
+    with memoryview(data) as view, view[offset + header_len:] as payload:
+        if (header.get('marshal_version') != marshal.version
+                or hashlib.sha256(payload).hexdigest() != header.get('sha256')):
+            print(f"⚠️ ملف {path} تالف أو من إصدار Python آخر، سيتم استخدام ملفات JSON")
+            return None
+        return marshal.loads(payload)
+
+
+def _ordinals_compatible(known, ordinals, next_ordinal=0):
+    """True if `ordinals` never moves a known question or reuses a known or retired ordinal"""
+    owners = {o: q_id for q_id, o in known.items()}
+    return all(
+        known.get(q_id, o) == o if q_id in known else o >= next_ordinal and o not in owners
+        for q_id, o in ordinals.items()
+    )
+
+
+def load_bank(sources=QUESTION_SOURCES, artifact=BANK_ARTIFACT, version=1, ordinals=None, next_ordinal=0):
+    """Load the compiled artifact when it is fresh, otherwise parse the JSON files"""
+    state = read_artifact(artifact, sources) if artifact else None
+    if state is not None and _ordinals_compatible(ordinals or {}, state['ordinals'], next_ordinal):
+        return QuestionBank.from_state(state, version, next_ordinal)
+    return QuestionBank(
+        load_questions(sources),
+        version=version,
+        ordinals=ordinals,
+        normalized=_normalized_from_states(state['normalized']) if state else None,
+        next_ordinal=next_ordinal,
+    )
+
+
+class QuestionBankManager:
+    """Holds the current QuestionBank and swaps in reloaded versions atomically.
+
+    The last `keep_versions` banks stay available so questions that were
+    sent before a reload still resolve against the version they came from.
+    `ordinals` and `next_ordinal` (e.g. read back from the database) seed
+    the first bank so ordinals also survive a restart.
+    """
+
+    def __init__(self, sources=QUESTION_SOURCES, artifact=BANK_ARTIFACT, keep_versions=5,
+                 ordinals=None, next_ordinal=0):
+        self.sources = sources
+        self.artifact = artifact
+        self.keep_versions = keep_versions
+        self._lock = threading.Lock()
+        self._reloading = threading.Lock()
+        self._versions = OrderedDict()
+        self._listeners = []
+        self._mtimes = self._source_mtimes()
+        self.current = load_bank(sources, artifact, version=1, ordinals=ordinals, next_ordinal=next_ordinal)
+        self._versions[1] = self.current
+
+    def _source_mtimes(self):
+        return tuple(
+            os.stat(path).st_mtime_ns if os.path.exists(path) else None
+            for path, _ in self.sources
+        )
+
+    def subscribe(self, listener):
+        """Call `listener(bank)` after every reload"""
+        self._listeners.append(listener)
+
+    def bank_for(self, version=None):
+        """The bank a question was issued from, or the current one if it was dropped"""
+        return self._versions.get(version) or self.current
+
+    def resolve(self, q_id, version=None):
+        """Find a question in the bank version it was issued from (or the current one)"""
+        return self.bank_for(version).get(q_id)
+
+    def resolve_ordinal(self, ordinal, version=None):
+        """Like `resolve` but by ordinal (ordinals are never reused, so the current bank is a safe fallback)"""
+        return self.bank_for(version).at(ordinal) or self.current.at(ordinal)
+
+    def reload(self):
+        """Build a new bank from the sources and swap it in. Returns the new bank."""
+        with self._reloading:
+            mtimes = self._source_mtimes()
+            previous = self.current
+            bank = load_bank(
+                self.sources,
+                self.artifact,
+                version=previous.version + 1,
+                ordinals=previous.ordinals,
+                next_ordinal=previous.next_ordinal,
+            )
+            with self._lock:
+                self._versions[bank.version] = bank
+                while len(self._versions) > self.keep_versions:
+                    self._versions.popitem(last=False)
+                self._mtimes = mtimes
+                self.current = bank
+        print(f"🔄 تم تحميل بنك الأسئلة (الإصدار {bank.version}): {len(bank)} سؤال")
+        for listener in self._listeners:
+            try:
+                listener(bank)
+            except Exception as e:
+                print(f"⚠️ فشل تنفيذ {getattr(listener, '__name__', listener)} بعد التحميل: {e}")
+        return bank
+
+    def reload_async(self, on_done=None, on_error=None):
+        """Reload in a background thread; handlers keep using the old bank meanwhile"""
+        def run():
+            try:
+                bank = self.reload()
+            except Exception as e:
+                print(f"فشل تحميل بنك الأسئلة: {e}")
+                if on_error:
+                    on_error(e)
+                return
+            if on_done:
+                on_done(bank)
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def refresh_if_changed(self):
+        """File watcher hook: reload when any source file's mtime changed"""
+        if self._source_mtimes() != self._mtimes and not self._reloading.locked():
+            self.reload_async()
+            return True
+        return False
@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+
+"""
+Question sampler
+اختيار سؤال عشوائي غير مجاب دون بناء قائمة المرشحين في كل طلب
+"""
+
+import random
+import threading
+from collections import OrderedDict
+
+
+class AnsweredSet:
+    """Compact set of answered question ordinals (one bit per question)"""
+
+    __slots__ = ('bits',)
+
+    def __init__(self, data=b''):
+        self.bits = bytearray(data)
+
+    def __contains__(self, ordinal):
+        byte = ordinal >> 3
+        return byte < len(self.bits) and bool(self.bits[byte] & (1 << (ordinal & 7)))
+
+    def __len__(self):
+        return sum(bin(b).count('1') for b in self.bits)
+
+    def __iter__(self):
+        for byte, value in enumerate(self.bits):
+            for bit in range(8):
+                if value & (1 << bit):
+                    yield byte * 8 + bit
+
+    def add(self, ordinal):
+        byte = ordinal >> 3
+        if byte >= len(self.bits):
+            self.bits.extend(bytes(byte - len(self.bits) + 1))
+        self.bits[byte] |= 1 << (ordinal & 7)
+
+    def discard(self, ordinal):
+        byte = ordinal >> 3
+        if byte < len(self.bits):
+            self.bits[byte] &= ~(1 << (ordinal & 7)) & 0xFF
+
+    def clear(self):
+        self.bits = bytearray()
+
+    def to_bytes(self):
+        return bytes(self.bits)
+
+
+def sample_unanswered(pool, answered, rng=random, attempts=8, prefer=None):
+    """Pick a random ordinal from `pool` that is not in `answered`.
+
+    A few random probes cover the common case (most of the pool still
+    unanswered) in O(1); when they all hit answered questions we fall back
+    to a single reservoir pass over the pool, which is still uniform and
+    allocates nothing. Returns None when every question in the pool is
+    answered.
+
+    With `prefer` (a predicate on ordinals) the probes return the first
+    unanswered ordinal it accepts, else the first unanswered one they hit;
+    the preference is best effort and never makes a pick fail.
+    """
+    size = len(pool)
+    if not size:
+        return None
+
+    fallback = None
+    for _ in range(attempts):
+        ordinal = pool[rng.randrange(size)]
+        if ordinal not in answered:
+            if prefer is None or prefer(ordinal):
+                return ordinal
+            if fallback is None:
+                fallback = ordinal
+    if fallback is not None:
+        return fallback
+
+    chosen = None
+    seen = 0
+    for ordinal in pool:
+        if ordinal not in answered:
+            seen += 1
+            if rng.randrange(seen) == 0:
+                chosen = ordinal
+    return chosen
+
+
+class QuestionSampler:
+    """Per-user answered sets cached in memory (LRU), keyed by question ordinal.
+
+    Ordinals are stable across bank reloads, so the cached sets stay valid
+    whichever bank version the caller passes in.
+    """
+
+    def __init__(self, max_users=10000):
+        self.max_users = max_users
+        self._answered = OrderedDict()
+        self._lock = threading.Lock()
+
+    def answered_set(self, chat_id, load_answered_bits):
+        """Return the cached AnsweredSet, loading its stored bitmap once via `load_answered_bits`"""
+        with self._lock:
+            answered = self._answered.get(chat_id)
+            if answered is not None:
+                self._answered.move_to_end(chat_id)
+                return answered
+
+        answered = AnsweredSet(load_answered_bits())
+
+        with self._lock:
+            answered = self._answered.setdefault(chat_id, answered)
+            self._answered.move_to_end(chat_id)
+            while len(self._answered) > self.max_users:
+                self._answered.popitem(last=False)
+        return answered
+
+    def mark_answered(self, bank, chat_id, q_id):
+        ordinal = bank.ordinal(q_id)
+        with self._lock:
+            answered = self._answered.get(chat_id)
+            if answered is not None and ordinal is not None:
+                answered.add(ordinal)
+
+    def reset(self, chat_id):
+        with self._lock:
+            answered = self._answered.get(chat_id)
+            if answered is not None:
+                answered.clear()
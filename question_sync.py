@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+"""
+Question table sync
+مزامنة جدول questions مع بنك الأسئلة (JSON) بكتابة الأسئلة المتغيرة فقط
+"""
+
+import hashlib
+import json
+
+from db_writer import get_writer
+
+# الأعمدة التي تأتي من ملفات JSON (difficulty لا تُكتب هنا حتى لا تُمسح معايرتها)
+COLUMNS = ('id', 'question', 'subject', 'topic', 'page', 'type', 'choices', 'correct_indices',
+           'answer', 'answer_keywords', 'explanation', 'hint', 'reference', 'ordinal', 'content_hash')
+
+_JSON_FIELDS = ('choices', 'correct_indices', 'answer_keywords')
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, sort_keys=True)
+
+
+def question_hash(q, ordinal):
+    return hashlib.sha1(f"{ordinal}:{_dumps(q)}".encode('utf-8')).hexdigest()
+
+
+def question_row(q, ordinal, content_hash):
+    row = {
+        'id': q['id'],
+        'question': q['question'],
+        'subject': q.get('subject'),
+        'topic': q.get('topic'),
+        'page': q.get('page'),
+        'type': q['type'],
+        'answer': q.get('answer'),
+        'explanation': q.get('explanation'),
+        'hint': q.get('hint'),
+        'reference': q.get('reference'),
+        'ordinal': ordinal,
+        'content_hash': content_hash,
+    }
+    for field in _JSON_FIELDS:
+        row[field] = _dumps(q[field]) if field in q else None
+    return tuple(row[column] for column in COLUMNS)
+
+
+def bank_hashes(bank):
+    """({q_id: hash}, hash of the whole bank)"""
+    hashes = {q['id']: question_hash(q, bank.ordinals[q['id']]) for q in bank.questions}
+    digest = hashlib.sha1(f"next_ordinal={bank.next_ordinal}\n".encode('utf-8'))
+    for q_id in sorted(hashes):
+        digest.update(f"{q_id}={hashes[q_id]}\n".encode('utf-8'))
+    return hashes, digest.hexdigest()
+
+
+def sync_questions(conn, bank):
+    """Upsert changed questions and delete removed ones; returns (upserted, deleted).
+
+    The hash of the whole bank is stored in sync_state, so an unchanged
+    bank costs one row read. Runs inside the caller's transaction.
+    """
+    hashes, bank_hash = bank_hashes(bank)
+    stored = conn.execute("SELECT value FROM sync_state WHERE key = 'questions'").fetchone()
+    if stored and stored[0] == bank_hash:
+        return 0, 0
+
+    existing = dict(conn.execute('SELECT id, content_hash FROM questions').fetchall())
+    changed = [
+        question_row(bank.get(q_id), bank.ordinals[q_id], content_hash)
+        for q_id, content_hash in hashes.items()
+        if existing.get(q_id) != content_hash
+    ]
+    removed = [(q_id,) for q_id in existing if q_id not in hashes]
+
+    updates = ', '.join(f'{column} = excluded.{column}' for column in COLUMNS[1:])
+    conn.executemany(f'''
+    INSERT INTO questions ({', '.join(COLUMNS)})
+    VALUES ({', '.join('?' * len(COLUMNS))})
+    ON CONFLICT(id) DO UPDATE SET {updates}''', changed)
+    conn.executemany('DELETE FROM questions WHERE id = ?', removed)
+    conn.executemany('''
+    INSERT INTO sync_state (key, value) VALUES (?, ?)
+    ON CONFLICT(key) DO UPDATE SET value = excluded.value''',
+    [('questions', bank_hash), ('next_ordinal', str(bank.next_ordinal))])
+    return len(changed), len(removed)
+
+
+def load_ordinals(conn):
+    """({q_id: ordinal}, next_ordinal) as last synced, to seed QuestionBankManager"""
+    ordinals = dict(conn.execute('SELECT id, ordinal FROM questions WHERE ordinal IS NOT NULL').fetchall())
+    row = conn.execute("SELECT value FROM sync_state WHERE key = 'next_ordinal'").fetchone()
+    return ordinals, int(row[0]) if row else 0
+
+
+def sync_bank(bank):
+    """Sync `bank` into the questions table on the writer thread"""
+    upserted, deleted = get_writer().call(sync_questions, bank)
+    if upserted or deleted:
+        print(f"🗂️ مزامنة جدول الأسئلة (الإصدار {bank.version}): {upserted} محدث، {deleted} محذوف")
+    return upserted, deleted
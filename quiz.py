@@ -7,20 +7,34 @@ Developer: eyadc
 """
 
 import os
+import sys
 import time
-import json
-import random
+import signal
 from datetime import datetime
 
 # Import libraries
-import sqlite3
 import telebot
 from threading import Thread
 from telebot import types
-from difflib import SequenceMatcher
 from apscheduler.schedulers.background import BackgroundScheduler
-import pyarabic.araby as araby
 from dotenv import load_dotenv
+from answered_bits import clear_answered, convert_user_answered, load_answered_bits
+from adaptive_selector import AdaptiveSelector
+from answers import record_answer, record_question_rating
+from arabic_text import preprocess_arabic
+from callback_codec import CallbackCodec, claim_tap, purge_taps
+from calibration import DifficultyCalibrator, target_level
+from compaction import MistakesCompactor
+from db import get_connection, rollback_connection
+from db_writer import get_writer
+from grading import grade_answer
+from migrations import migrate
+from question_bank import QuestionBankManager
+from question_sync import load_ordinals, sync_bank
+from question_sampler import QuestionSampler
+from session_store import SessionStore
+from spaced_repetition import due_reviews, users_with_due_reviews
+from topics_catalog import TopicsCatalog
 from flask import Flask, request, render_template_string
 app = Flask(__name__)
 
@@ -37,7 +51,12 @@ if not TELEGRAM_BOT_TOKEN:
 
 # Initialize bot
 bot = telebot.TeleBot(TELEGRAM_BOT_TOKEN)
-bot.current_questions = {}
+# توقيع أزرار الاختيار من متعدد (callback_data تحمل السؤال والاختيار)
+callback_codec = CallbackCodec.from_env()
+# السؤال النشط لكل مستخدم (ذاكرة محدودة بمدة صلاحية ومحفوظة في active_questions)
+bot.current_questions = SessionStore.from_env()
+# المستخدمون في وضع المراجعة (/review): send_question يرسل الأسئلة المستحقة للمراجعة أولاً
+bot.review_mode = set()
 
 print("✅ البوت جاهز للتشغيل")
 print("📁 مسار التشغيل:", os.getcwd())
@@ -48,142 +67,44 @@ print("🔐 التوكن محمل:", TELEGRAM_BOT_TOKEN[:10] + "..." if TELEGRAM
 scheduler = BackgroundScheduler()
 scheduler.start()
 
-with open('questions_full.json', 'r', encoding='utf-8') as f:
-    questions = json.load(f)
-    print(f"Debug: Loaded {len(questions)} questions")  # طباعة عدد الأسئلة المحملة
+# حذف الأسئلة النشطة المنتهية الصلاحية
+bot.current_questions.start(scheduler)
+# حذف سجل الأزرار المجابة بعد انتهاء صلاحيتها
+scheduler.add_job(lambda: get_writer().call(purge_taps, callback_codec.ttl), 'interval', hours=1)
 
-# إضافة جداول جديدة في init_db()
+# إنشاء الجداول وتطبيق ترحيلات المخطط (migrations.py)
 def init_db():
-    conn = sqlite3.connect('science_bot.db')
-    cursor = conn.cursor()
-    
-    # إنشاء الجداول الأساسية
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS users (
-        chat_id INTEGER PRIMARY KEY,
-        register_date TEXT NOT NULL,
-        last_active TEXT NOT NULL,
-        score INTEGER DEFAULT 0,
-        attempts INTEGER DEFAULT 0,
-        selected_subject TEXT,  -- المادة المختارة
-        selected_topic TEXT
-    )''')
-
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS questions (
-        id TEXT PRIMARY KEY,
-        question TEXT NOT NULL,
-        topic TEXT,
-        page TEXT,
-        type TEXT NOT NULL,
-        choices TEXT,  
-        correct_indices TEXT,  
-        answer TEXT,
-        answer_keywords TEXT,  
-        explanation TEXT,
-        hint TEXT,
-        reference TEXT,
-        difficulty INTEGER DEFAULT 1
-    )''')
-    
-    # إضافة جدول الدعوات
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS user_invites (
-        chat_id INTEGER,
-        invite_code TEXT PRIMARY KEY,
-        created_at TEXT NOT NULL,
-        uses INTEGER DEFAULT 0,
-        FOREIGN KEY (chat_id) REFERENCES users (chat_id)
-    )''')
-    
-    # إضافة جدول الملاحظات
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS user_feedback (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        chat_id INTEGER,
-        feedback_text TEXT NOT NULL,
-        rating INTEGER,
-        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (chat_id) REFERENCES users (chat_id)
-    )''')
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS user_answered (
-        chat_id INTEGER,
-        question_id TEXT,
-        PRIMARY KEY (chat_id, question_id),
-        FOREIGN KEY (chat_id) REFERENCES users (chat_id)
-    )''')
-    
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS user_topics (
-        chat_id INTEGER,
-        topic TEXT,
-        correct INTEGER DEFAULT 0,
-        attempts INTEGER DEFAULT 0,
-        PRIMARY KEY (chat_id, topic)
-    )''')
-    
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS hard_questions (
-        chat_id INTEGER,
-        question_id TEXT,
-        PRIMARY KEY (chat_id, question_id)
-    )''')
-    # جدول جلسات المستخدم
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS user_sessions (
-        session_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        chat_id INTEGER,
-        start_time TEXT,
-        end_time TEXT,
-        questions_answered INTEGER,
-        FOREIGN KEY (chat_id) REFERENCES users (chat_id)
-    )''')
-    
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS user_mistakes (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        chat_id INTEGER,
-        question_id TEXT,
-        wrong_answer TEXT,
-        count INTEGER DEFAULT 1,
-        accuracy REAL,
-        last_updated TEXT DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY (chat_id) REFERENCES users (chat_id),
-        UNIQUE(chat_id, question_id, wrong_answer)
-    )''')
-    
-    # جدول تحليل الأخطاء
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS error_analysis (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        question_id TEXT,
-        wrong_answer TEXT,
-        count INTEGER DEFAULT 1,
-        common_mistakes TEXT,
-        FOREIGN KEY (question_id) REFERENCES questions (id)
-    )''')
-    
-    # إضافة فهارس لتحسين الأداء
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_chat_id ON users (chat_id)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_topics_chat_id ON user_topics (chat_id)')
-    cursor.execute('CREATE INDEX IF NOT EXISTS idx_sessions_chat_id ON user_sessions (chat_id)')
-    
-    conn.commit()
-    conn.close()
+    migrate(get_connection())
     
 init_db()
 
-print("Bot initialized:", bot.get_me())
+# بنك الأسئلة (questions_full.json + new.json) مع إمكانية إعادة التحميل دون إيقاف البوت
+# ترتيب الأسئلة (ordinals) يُقرأ من قاعدة البيانات ليبقى ثابتاً بعد إعادة التشغيل
+question_ordinals, next_ordinal = load_ordinals(get_connection())
+question_banks = QuestionBankManager(ordinals=question_ordinals, next_ordinal=next_ordinal)
+question_sampler = QuestionSampler()
+question_selector = AdaptiveSelector()
+scheduler.add_job(question_banks.refresh_if_changed, 'interval', seconds=30)
+print(f"Debug: Loaded {len(question_banks.current)} questions")  # طباعة عدد الأسئلة المحملة
+
+# مزامنة جدول questions مع بنك الأسئلة عند التشغيل وبعد كل إعادة تحميل
+sync_bank(question_banks.current)
+question_banks.subscribe(sync_bank)
 
-# Arabic text processing
-def preprocess_arabic(text):
-    text = araby.strip_tashkeel(text)
-    text = araby.normalize_hamza(text)
-    text = araby.strip_tatweel(text)
-    text = araby.normalize_ligature(text)  # إضافة هذه السطر
-    text = text.replace("،", "").replace(".", "").strip()  # إزالة علامات الترقيم
-    return text
+# تحويل صفوف user_answered القديمة إلى bitmap لكل مستخدم (مرة واحدة)
+while get_writer().call(convert_user_answered, question_banks.current.ordinals):
+    pass
+
+# معايرة صعوبة الأسئلة من نتائج الإجابات (المستويات محفوظة في الذاكرة)
+calibrator = DifficultyCalibrator.from_env()
+calibrator.run()
+calibrator.start(scheduler)
+
+# قائمة المواد والمواضيع في الذاكرة (يعاد تحميلها عند تعديل الملف)
+topics_catalog = TopicsCatalog('topics_info.json')
+scheduler.add_job(topics_catalog.refresh_if_changed, 'interval', seconds=30)
+
+print("Bot initialized:", bot.get_me())
 
 # Error handling decorator
 def handle_errors(func):
@@ -191,6 +112,8 @@ def handle_errors(func):
         try:
             return func(*args, **kwargs)
         except Exception as e:
+            # لا نترك معاملة مفتوحة على اتصال الخيط الدائم
+            rollback_connection()
             message = args[0]
             if hasattr(message, 'chat'):
                 bot.send_message(message.chat.id, "⚠️ حدث خطأ غير متوقع. يرجى المحاولة لاحقاً.")
@@ -225,110 +148,78 @@ def get_explanation(q):
 
 # User management functions
 def get_user(chat_id):
-    conn = sqlite3.connect('science_bot.db')
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute('SELECT * FROM users WHERE chat_id = ?', (chat_id,))
     user = cursor.fetchone()
-    conn.close()
     return user
     
 def init_user(chat_id):
-    conn = sqlite3.connect('science_bot.db')
-    cursor = conn.cursor()
-    
     now = datetime.now().isoformat()
-    cursor.execute('''
+    get_writer().execute('''
     INSERT OR IGNORE INTO users (chat_id, register_date, last_active)
     VALUES (?, ?, ?)
-    ''', (chat_id, now, now))
-    
-    conn.commit()
-    conn.close()
+    ''', (chat_id, now, now)).result()
 
 def update_user_last_active(chat_id):
-    conn = sqlite3.connect('science_bot.db')
-    cursor = conn.cursor()
-    cursor.execute('''
+    # لا حاجة لانتظار النتيجة: لا شيء يقرأ last_active مباشرة بعدها
+    get_writer().execute('''
     UPDATE users SET last_active = ? WHERE chat_id = ?
     ''', (datetime.now().isoformat(), chat_id))
-    conn.commit()
-    conn.close()
 
 def get_question_for_user(chat_id):
-    conn = sqlite3.connect('science_bot.db')
+    conn = get_connection()
     cursor = conn.cursor()
     
     # الحصول على المادة والموضوع المختارين
-    cursor.execute('SELECT selected_subject, selected_topic FROM users WHERE chat_id = ?', (chat_id,))
+    cursor.execute('SELECT selected_subject, selected_topic, score, attempts FROM users WHERE chat_id = ?', (chat_id,))
     result = cursor.fetchone()
     selected_subject = result[0] if result else None
     selected_topic = result[1] if result else None
     
-    # الحصول على الأسئلة المجابة
-    cursor.execute('SELECT question_id FROM user_answered WHERE chat_id = ?', (chat_id,))
-    answered_questions = [row[0] for row in cursor.fetchall()]
+    # تفضيل الأسئلة القريبة من مستوى المستخدم (مستويات الصعوبة في الذاكرة)
+    prefer = calibrator.prefer(target_level(result[2], result[3]) if result else target_level(0, 0))
     
-    # تصفية الأسئلة المتاحة بناءً على المادة والموضوع المختارين
-    available_questions = [
-        q for q in questions 
-        if (selected_subject is None or q.get('subject', 'العلوم') == selected_subject) and
-        (selected_topic is None or q.get('topic', 'عام') == selected_topic) and
-        q['id'] not in answered_questions
-    ]
+    # الأسئلة المجابة محفوظة في الذاكرة ولا تُقرأ من قاعدة البيانات إلا مرة واحدة (صف واحد)
+    bank = question_banks.current
+    answered = question_sampler.answered_set(chat_id, lambda: load_answered_bits(conn, chat_id))
+    # مراجعة الأخطاء والأسئلة الصعبة أو سؤال جديد من موضوع ضعيف (adaptive_selector.py)
+    q = question_selector.pick(conn, chat_id, bank, answered, selected_subject, selected_topic, prefer)
     
-    if not available_questions:
+    if q is None and bank.pool(selected_subject, selected_topic):
         # إعادة تعيين الأسئلة المجابة إذا لم توجد أسئلة جديدة
-        cursor.execute('DELETE FROM user_answered WHERE chat_id = ?', (chat_id,))
-        conn.commit()
-        available_questions = [
-            q for q in questions 
-            if (selected_subject is None or q.get('subject', 'العلوم') == selected_subject) and
-            (selected_topic is None or q.get('topic', 'عام') == selected_topic)
-        ]
-    
-    conn.close()
+        get_writer().call(clear_answered, chat_id)
+        question_sampler.reset(chat_id)
+        q = question_selector.pick(conn, chat_id, bank, answered, selected_subject, selected_topic, prefer)
     
-    return random.choice(available_questions) if available_questions else None
+    return q
+
+def get_review_question(chat_id):
+    """The most overdue review that is still in the bank (and not the question just sent)"""
+    bank = question_banks.current
+    current = bot.current_questions.get(chat_id)
+    for q_id in due_reviews(get_connection(), chat_id):
+        if q_id in bank and (not current or current[0] != q_id):
+            return bank.get(q_id)
+    return None
 
-def record_question_rating(chat_id, question_id, rating):
-    conn = sqlite3.connect('science_bot.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-    INSERT INTO question_ratings (chat_id, question_id, rating)
-    VALUES (?, ?, ?)
-    ''', (chat_id, question_id, rating))
-    
-    if rating == 'hard':
-        cursor.execute('''
-        INSERT OR IGNORE INTO hard_questions (chat_id, question_id)
-        VALUES (?, ?)
-        ''', (chat_id, question_id))
-    
-    conn.commit()
-    conn.close()
-    
 def generate_invite_link(chat_id):
-    conn = sqlite3.connect('science_bot.db')
-    cursor = conn.cursor()
-    
     # إنشاء رمز دعوة فريد
     invite_code = f"INV_{chat_id}_{int(time.time())}"
     
     # حفظه في قاعدة البيانات
-    cursor.execute('''
+    get_writer().execute('''
     INSERT OR REPLACE INTO user_invites 
     (chat_id, invite_code, created_at, uses) 
     VALUES (?, ?, datetime('now'), 0)
-    ''', (chat_id, invite_code))
-    
-    conn.commit()
-    conn.close()
+    ''', (chat_id, invite_code)).result()
     
     return f"https://t.me/{bot.get_me().username}?start={invite_code}"
 
 def record_invite_use(invite_code, new_user_id):
-    conn = sqlite3.connect('science_bot.db')
+    get_writer().call(_record_invite_use, invite_code, new_user_id)
+
+def _record_invite_use(conn, invite_code, new_user_id):
     cursor = conn.cursor()
     
     # البحث عن المستخدم الداعي
@@ -345,106 +236,30 @@ def record_invite_use(invite_code, new_user_id):
     
     # منح 5 نقاط للمستخدم الداعي
     cursor.execute('UPDATE users SET score = score + 5 WHERE chat_id = ?', (inviter_id,))
-    
-    conn.commit()
-    conn.close()
 
-def update_user_score(chat_id, is_correct, topic):
-    conn = sqlite3.connect('science_bot.db')
-    cursor = conn.cursor()
-    
-    # Update overall score
-    if is_correct:
-        cursor.execute('''
-        UPDATE users SET score = score + 1, attempts = attempts + 1 
-        WHERE chat_id = ?
-        ''', (chat_id,))
-    else:
-        cursor.execute('''
-        UPDATE users SET attempts = attempts + 1 
-        WHERE chat_id = ?
-        ''', (chat_id,))
-    
-    # Update topic stats
-    cursor.execute('''
-    INSERT OR IGNORE INTO user_topics (chat_id, topic, correct, attempts)
-    VALUES (?, ?, 0, 0)
-    ''', (chat_id, topic))
-    
-    if is_correct:
-        cursor.execute('''
-        UPDATE user_topics SET correct = correct + 1, attempts = attempts + 1
-        WHERE chat_id = ? AND topic = ?
-        ''', (chat_id, topic))
-    else:
-        cursor.execute('''
-        UPDATE user_topics SET attempts = attempts + 1
-        WHERE chat_id = ? AND topic = ?
-        ''', (chat_id, topic))
-    
-    conn.commit()
-    conn.close()
-    
 # إضافة هذه الدوال لبدء وإنهاء الجلسة
 def start_user_session(chat_id):
-    conn = sqlite3.connect('science_bot.db')
-    cursor = conn.cursor()
-    cursor.execute('''
+    return get_writer().execute('''
     INSERT INTO user_sessions (chat_id, start_time, questions_answered)
-    VALUES (?, ?, 0)''', (chat_id, datetime.now().isoformat()))
-    conn.commit()
-    return cursor.lastrowid
+    VALUES (?, ?, 0)''', (chat_id, datetime.now().isoformat())).result()
 
 def end_user_session(session_id):
-    conn = sqlite3.connect('science_bot.db')
-    cursor = conn.cursor()
-    cursor.execute('''
+    get_writer().execute('''
     UPDATE user_sessions 
     SET end_time = ?
-    WHERE session_id = ?''', (datetime.now().isoformat(), session_id))
-    conn.commit()
+    WHERE session_id = ?''', (datetime.now().isoformat(), session_id)).result()
 
 def record_question_answered(session_id):
-    conn = sqlite3.connect('science_bot.db')
-    cursor = conn.cursor()
-    cursor.execute('''
+    get_writer().execute('''
     UPDATE user_sessions 
     SET questions_answered = questions_answered + 1
-    WHERE session_id = ?''', (session_id,))
-    conn.commit()
-    
-def generate_feedback(chat_id, question_id, user_answer):
-    conn = sqlite3.connect('science_bot.db')
-    cursor = conn.cursor()
-    
-    # 1. تحليل الأخطاء الشائعة لهذا السؤال
-    cursor.execute('''
-    SELECT wrong_answer, count 
-    FROM error_analysis 
-    WHERE question_id = ? 
-    ORDER BY count DESC LIMIT 3''', (question_id,))
-    common_errors = cursor.fetchall()
-    
-    # 2. أداء المستخدم في الموضوع
-    # الحصول على موضوع السؤال من قائمة الأسئلة بدلاً من قاعدة البيانات
-    q = next((q for q in questions if q['id'] == question_id), None)
-    topic = q.get('topic', 'عام') if q else 'عام'
-    
-    cursor.execute('''
-    SELECT correct, attempts 
-    FROM user_topics 
-    WHERE chat_id = ? AND topic = ?''', (chat_id, topic))
-    topic_stats = cursor.fetchone()
-    
-    # 3. الأخطاء المتكررة للمستخدم
-    cursor.execute('''
-    SELECT question_id, wrong_answer, count 
-    FROM user_mistakes 
-    WHERE chat_id = ? AND question_id = ?
-    ORDER BY count DESC LIMIT 1''', (chat_id, question_id))
-    user_common_mistake = cursor.fetchone()
+    WHERE session_id = ?''', (session_id,)).result()
     
-    conn.close()
+def generate_feedback(recorded):
+    """Build the personalized feedback from the data returned by record_answer"""
+    common_errors = recorded['common_errors']
+    topic_stats = recorded['topic_stats']
+    user_common_mistake = recorded['user_mistake']
     
     # بناء التغذية الراجعة
     feedback_parts = []
@@ -468,42 +283,6 @@ def generate_feedback(chat_id, question_id, user_answer):
     
     return "\n".join(feedback_parts) if feedback_parts else "حاول مراجعة الإجابة النموذجية للتعلم من أخطائك."
     
-def record_answer_analysis(chat_id, question_id, user_answer, is_correct, accuracy):
-    conn = sqlite3.connect('science_bot.db')
-    cursor = conn.cursor()
-    
-    # تسجيل في جدول تحليل الأخطاء
-    if not is_correct:
-        # البحث عن الخطأ المسجل مسبقاً
-        cursor.execute('''
-        SELECT id, count FROM error_analysis 
-        WHERE question_id = ? AND wrong_answer = ?''',
-        (question_id, user_answer))
-        
-        error_record = cursor.fetchone()
-        
-        if error_record:
-            # تحديث العداد إذا كان الخطأ مسجلاً
-            error_id, count = error_record
-            cursor.execute('UPDATE error_analysis SET count = count + 1 WHERE id = ?', (error_id,))
-        else:
-            # تسجيل خطأ جديد
-            cursor.execute('''
-            INSERT INTO error_analysis (question_id, wrong_answer)
-            VALUES (?, ?)''', (question_id, user_answer))
-    
-    # تسجيل في جدول أخطاء المستخدم
-    if not is_correct:
-        cursor.execute('''
-        INSERT INTO user_mistakes (chat_id, question_id, wrong_answer, accuracy)
-        VALUES (?, ?, ?, ?)
-        ON CONFLICT(chat_id, question_id, wrong_answer) 
-        DO UPDATE SET count = count + 1, accuracy = MIN(accuracy, ?)''',
-        (chat_id, question_id, user_answer, accuracy, accuracy))
-    
-    conn.commit()
-    conn.close()
-
 def show_question_followup(chat_id, question_id):
     markup = types.InlineKeyboardMarkup()
     markup.row(
@@ -527,9 +306,7 @@ def handle_subjects_list(call):
         print("تم تفعيل معالج المواد الرئيسي")  # للتتبع
         chat_id = call.message.chat.id
         
-        # تحميل البيانات من ملف JSON
-        with open('topics_info.json', 'r', encoding='utf-8') as f:
-            subjects = json.load(f)['subjects'].keys()
+        subjects = topics_catalog.subjects.keys()
         
         # إنشاء أزرار المواد
         markup = types.InlineKeyboardMarkup(row_width=2)
@@ -556,12 +333,8 @@ def handle_subject_selection(call):
     subject = call.data.split('_')[1]  # استخراج اسم المادة
     bot.answer_callback_query(call.id)
     
-    # تحميل معلومات المواضيع من ملف topics_info.json
-    with open('topics_info.json', 'r', encoding='utf-8') as f:
-        topics_info = json.load(f)
-    
     # الحصول على مواضيع المادة المحددة
-    subject_topics = topics_info['subjects'].get(subject, {}).get('topics', {}).keys()
+    subject_topics = (topics_catalog.subject_topics(subject) or {}).keys()
     
     if not subject_topics:
         bot.send_message(chat_id, f"⚠️ لا توجد مواضيع متاحة لمادة {subject} حالياً.")
@@ -588,30 +361,16 @@ def handle_topic_selection(call):
     chat_id = call.message.chat.id
     topic_name = call.data[7:]  # إزالة 'select_' من البيانات
     
-    with open('topics_info.json', 'r', encoding='utf-8') as f:
-        topics_data = json.load(f)
-    
-    # البحث عن الموضوع في جميع المواد
-    topic_info = None
-    subject_name = None
-    
-    for subject, subject_data in topics_data['subjects'].items():
-        if topic_name in subject_data['topics']:
-            topic_info = subject_data['topics'][topic_name]
-            subject_name = subject
-            break
+    # البحث عن الموضوع في الفهرس العكسي
+    subject_name, topic_info = topics_catalog.find_topic(topic_name)
     
     if not topic_info:
         bot.answer_callback_query(call.id, "⚠️ الموضوع غير موجود")
         return
     
     # تحديث الموضوع المختار في قاعدة البيانات
-    conn = sqlite3.connect('science_bot.db')
-    cursor = conn.cursor()
-    cursor.execute('''UPDATE users SET selected_topic = ?, selected_subject = ? WHERE chat_id = ?''', 
-                  (topic_name, subject_name, chat_id))
-    conn.commit()
-    conn.close()
+    get_writer().execute('''UPDATE users SET selected_topic = ?, selected_subject = ? WHERE chat_id = ?''', 
+                  (topic_name, subject_name, chat_id)).result()
     
     # إرسال تفاصيل الموضوع
     response = f"✅ تم اختيار موضوع: *{topic_name}*\n\n"
@@ -634,13 +393,14 @@ def handle_random_question(call):
 @handle_errors
 def get_hint(call):
     chat_id = call.message.chat.id
-    q_id = bot.current_questions.get(chat_id)
+    current = bot.current_questions.get(chat_id)
     
-    if not q_id:
+    if not current:
         bot.answer_callback_query(call.id, "انتهت صلاحية السؤال.")
         return
     
-    q = next((q for q in questions if q['id'] == q_id), None)
+    q_id, bank_version = current
+    q = question_banks.resolve(q_id, bank_version)
     if not q:
         bot.answer_callback_query(call.id, "حدث خطأ في تحميل السؤال.")
         return
@@ -694,26 +454,55 @@ def handle_my_stats(call):
     bot.answer_callback_query(call.id)
     show_score(call.message)
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith('mcq_'))
+@bot.callback_query_handler(func=lambda call: CallbackCodec.matches(call.data))
 @handle_errors
 def handle_choice(call):
+    # السؤال والاختيار في callback_data نفسها (موقّعة): لا حاجة للسؤال النشط
+    chat_id = call.message.chat.id
+    decoded = callback_codec.decode(chat_id, call.data)
+    if not decoded:
+        bot.answer_callback_query(call.id, "انتهت صلاحية السؤال.")
+        return
+    ordinal, bank_version, issued, selected_index = decoded
+    q = question_banks.resolve_ordinal(ordinal, bank_version)
+    if not q:
+        bot.answer_callback_query(call.id, "حدث خطأ في تحميل السؤال.")
+        return
+    # كل سؤال مُرسل يُصحَّح مرة واحدة (الضغط على رسالة قديمة لا يغير النتيجة)
+    if not get_writer().call(claim_tap, chat_id, ordinal, issued):
+        bot.answer_callback_query(call.id, "لقد أجبت عن هذا السؤال بالفعل.")
+        return
+    grade_choice(chat_id, q, ordinal, selected_index)
+
+@bot.callback_query_handler(func=lambda call: call.data.startswith('mcq_'))
+@handle_errors
+def handle_legacy_choice(call):
+    # أزرار أُرسلت قبل الترميز الموقّع: السؤال من الجلسة النشطة
     chat_id = call.message.chat.id
     selected_index = int(call.data.split('_')[1])
-    q_id = bot.current_questions.get(chat_id)
-    if not q_id:
+    current = bot.current_questions.get(chat_id)
+    if not current:
         bot.answer_callback_query(call.id, "انتهت صلاحية السؤال.")
         return
-    q = next((q for q in questions if q['id'] == q_id), None)
+    q_id, bank_version = current
+    q = question_banks.resolve(q_id, bank_version)
     if not q:
         bot.answer_callback_query(call.id, "حدث خطأ في تحميل السؤال.")
         return
+    # لا توقيت في هذه الأزرار: إنهاء الجلسة يمنع الضغط عليها مرة ثانية
+    bot.current_questions.discard(chat_id)
+    grade_choice(chat_id, q, question_banks.bank_for(bank_version).ordinal(q_id), selected_index)
 
+def grade_choice(chat_id, q, ordinal, selected_index):
+    q_id = q['id']
     correct_indices = q.get('correct_indices', [])
     is_correct = selected_index in correct_indices
-    update_user_score(chat_id, is_correct, q.get('topic', 'عام'))
+    accuracy = 100 if is_correct else 0
+    record_answer(chat_id, q_id, q.get('topic', 'عام'), is_correct, accuracy=accuracy, ordinal=ordinal)
+    question_sampler.mark_answered(question_banks.current, chat_id, q_id)
+    question_selector.record_answer(chat_id, q, is_correct)
 
     explanation = get_explanation(q)
-    accuracy = 100 if is_correct else 0
 
     if is_correct:
         response = f"✅ *إجابة صحيحة!* ({accuracy}%)\n\n{explanation}"
@@ -723,31 +512,24 @@ def handle_choice(call):
 
     bot.send_message(chat_id, response, parse_mode="Markdown")
     
-    # زر سؤال جديد
-    markup = types.InlineKeyboardMarkup()
-    markup.add(types.InlineKeyboardButton("➡️ سؤال جديد", callback_data="next_question"))
-    bot.send_message(chat_id, "✨ هل تريد سؤالًا جديدًا؟", reply_markup=markup)
-    
-    # بعد التأكد من صحة الإجابة
-    conn = sqlite3.connect('science_bot.db')
-    cursor = conn.cursor()
-    cursor.execute('INSERT OR IGNORE INTO user_answered VALUES (?, ?)', (chat_id, q_id))
-    conn.commit()
-    conn.close()
+    # تقييم السؤال (سهل/صعب) مع زر سؤال جديد
+    show_question_followup(chat_id, q_id)
 
 @bot.callback_query_handler(func=lambda call: call.data.startswith('rate_'))
 @handle_errors
 def handle_rating(call):
     chat_id = call.message.chat.id
-    _, rating, q_id = call.data.split('_')
+    # معرفات الأسئلة نفسها تحتوي على _ (q_001، new_q_004)
+    _, rating, q_id = call.data.split('_', 2)
     
     record_question_rating(chat_id, q_id, rating)
     bot.answer_callback_query(call.id, "شكراً لتقييمك!")
     
     if rating == 'hard':
+        q = question_banks.current.get(q_id)
+        if q:
+            question_selector.mark_hard(chat_id, q)
         bot.send_message(chat_id, "سنعيد هذا السؤال لاحقاً لمساعدتك في فهمه بشكل أفضل.")
-    
-    show_question_followup(chat_id, q_id)
 
 @bot.callback_query_handler(func=lambda call: call.data == 'next_question')
 @handle_errors
@@ -839,23 +621,36 @@ def send_question(message):
     init_user(message.chat.id)
     update_user_last_active(message.chat.id)
     
-    q = get_question_for_user(message.chat.id)
+    q = None
+    if message.chat.id in bot.review_mode:
+        q = get_review_question(message.chat.id)
+        if not q:
+            bot.review_mode.discard(message.chat.id)
+            bot.send_message(message.chat.id, "🎉 أنهيت كل المراجعات المستحقة! نتابع بأسئلة جديدة.")
+    
+    review = q is not None
+    q = q or get_question_for_user(message.chat.id)
     if not q:
         bot.reply_to(message, "لا توجد أسئلة متاحة حالياً.")
         return
     
     # بناء نص السؤال
-    question_text = f"📚 *السؤال* (موضوع: {q.get('topic', 'عام')} - ص {q.get('page', '?')})\n"
+    question_text = "🔁 *مراجعة*\n" if review else ""
+    question_text += f"📚 *السؤال* (موضوع: {q.get('topic', 'عام')} - ص {q.get('page', '?')})\n"
     question_text += q['question']
     
-    # حفظ السؤال الحالي
-    bot.current_questions[message.chat.id] = q['id']
+    # حفظ السؤال الحالي مع إصدار البنك الذي صدر منه
+    bank = question_banks.current
+    bot.current_questions.set(message.chat.id, q['id'], bank.version)
     
     # إرسال السؤال مع الخيارات إن وجدت
     if q['type'] == 'mcq':
         markup = types.InlineKeyboardMarkup()
+        ordinal = bank.ordinal(q['id'])
+        issued = int(time.time())
         for i, choice in enumerate(q['choices']):
-            btn = types.InlineKeyboardButton(text=choice, callback_data=f"mcq_{i}")
+            data = callback_codec.encode(message.chat.id, ordinal, bank.version, i, issued)
+            btn = types.InlineKeyboardButton(text=choice, callback_data=data)
             markup.add(btn)
         bot.send_message(message.chat.id, question_text, parse_mode="Markdown", reply_markup=markup)
     else:
@@ -877,13 +672,23 @@ def send_question(message):
             reply_markup=action_markup
         )
 
+@bot.message_handler(commands=['review'])
+@handle_errors
+def start_review(message):
+    init_user(message.chat.id)
+    if not due_reviews(get_connection(), message.chat.id, limit=1):
+        bot.reply_to(message, "✅ لا توجد أسئلة مستحقة للمراجعة الآن.")
+        return
+    bot.review_mode.add(message.chat.id)
+    send_question(message)
+
 @bot.message_handler(commands=['score'])
 @handle_errors
 def show_score(message):
     init_user(message.chat.id)
     update_user_last_active(message.chat.id)
     
-    conn = sqlite3.connect('science_bot.db')
+    conn = get_connection()
     cursor = conn.cursor()
     
     # Get overall stats
@@ -907,8 +712,6 @@ def show_score(message):
     ''', (message.chat.id,))
     topics = cursor.fetchall()
     
-    conn.close()
-    
     response = f"🎯 نتيجتك: {score} / {attempts}\nالنسبة المئوية: {percentage:.1f}%\n\n"
     response += "📊 إحصائيات المواضيع:\n"
     
@@ -924,23 +727,17 @@ def list_topics(message):
     chat_id = message.chat.id
     
     # الحصول على المادة المختارة من قاعدة البيانات
-    conn = sqlite3.connect('science_bot.db')
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute('SELECT selected_subject FROM users WHERE chat_id = ?', (chat_id,))
     result = cursor.fetchone()
     selected_subject = result[0] if result else 'العلوم'
-    conn.close()
-    
-    # تحميل المواضيع من الهيكل الجديد
-    with open('topics_info.json', 'r', encoding='utf-8') as f:
-        topics_info = json.load(f)
     
-    if selected_subject not in topics_info['subjects']:
+    subject_topics = topics_catalog.subject_topics(selected_subject)
+    if subject_topics is None:
         bot.send_message(chat_id, "⚠️ المادة المختارة غير متوفرة حالياً.")
         return
     
-    subject_topics = topics_info['subjects'][selected_subject]['topics'].keys()
-    
     # إنشاء لوحة أزرار للمواضيع
     markup = types.InlineKeyboardMarkup(row_width=2)
     buttons = [
@@ -967,18 +764,17 @@ def select_topic_command(message):
     chat_id = message.chat.id
     
     # الحصول على المادة المختارة
-    conn = sqlite3.connect('science_bot.db')
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute('SELECT selected_subject FROM users WHERE chat_id = ?', (chat_id,))
     result = cursor.fetchone()
     selected_subject = result[0] if result else 'العلوم'
-    conn.close()
 
     # تحميل مواضيع المادة المختارة
-    with open('topics_info.json', 'r', encoding='utf-8') as f:
-        topics_info = json.load(f)
-    
-    subject_topics = topics_info['subjects'][selected_subject]['topics'].keys()
+    subject_topics = topics_catalog.subject_topics(selected_subject)
+    if subject_topics is None:
+        bot.send_message(chat_id, "⚠️ المادة المختارة غير متوفرة حالياً.")
+        return
     
     # إنشاء لوحة أزرار للمواضيع
     markup = types.ReplyKeyboardMarkup(row_width=2, one_time_keyboard=True)
@@ -994,13 +790,14 @@ def select_topic_command(message):
 @handle_errors
 def explain_command_handler(message):
     chat_id = message.chat.id
-    q_id = bot.current_questions.get(chat_id)
+    current = bot.current_questions.get(chat_id)
     
-    if not q_id:
+    if not current:
         bot.send_message(chat_id, "⚠️ لا يوجد سؤال نشط حالياً")
         return
         
-    q = next((q for q in questions if q['id'] == q_id), None)
+    q_id, bank_version = current
+    q = question_banks.resolve(q_id, bank_version)
     
     if not q:
         bot.send_message(chat_id, "⚠️ عذراً، حدث خطأ في تحميل السؤال")
@@ -1021,16 +818,10 @@ def feedback_command(message):
     bot.register_next_step_handler(msg, process_feedback)
 
 def process_feedback(message):
-    conn = sqlite3.connect('science_bot.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
+    get_writer().execute('''
     INSERT INTO user_feedback (chat_id, feedback_text)
     VALUES (?, ?)
-    ''', (message.chat.id, message.text))
-    
-    conn.commit()
-    conn.close()
+    ''', (message.chat.id, message.text)).result()
     
     bot.reply_to(message, "شكراً لك على ملاحظتك القيمة! سنعمل على تحسين البوت بناءً على آرائكم.")
     
@@ -1062,34 +853,33 @@ def invite_command(message):
 @bot.message_handler(commands=['stats'])
 @handle_errors
 def show_stats(message):
-    conn = sqlite3.connect('science_bot.db')
+    conn = get_connection()
     cursor = conn.cursor()
     
-    # إحصائيات عامة
-    cursor.execute('SELECT COUNT(*) FROM users')
-    total_users = cursor.fetchone()[0]
+    # إحصائيات عامة (من جداول التجميع stats_*)
+    cursor.execute('SELECT users FROM stats_totals')
+    row = cursor.fetchone()
+    total_users = row[0] if row else 0
     
-    cursor.execute('SELECT SUM(questions_answered) FROM user_sessions')
+    cursor.execute('SELECT SUM(questions_answered) FROM stats_monthly')
     total_questions = cursor.fetchone()[0] or 0
     
     # إحصائيات الوقت
     cursor.execute('''
-    SELECT strftime('%H', start_time) as hour, COUNT(*) 
-    FROM user_sessions 
-    GROUP BY hour
-    ORDER BY COUNT(*) DESC LIMIT 3''')
+    SELECT hour, sessions 
+    FROM stats_hourly 
+    WHERE sessions > 0
+    ORDER BY sessions DESC LIMIT 3''')
     peak_hours = cursor.fetchall()
     
     # تحليل الأخطاء الشائعة
     cursor.execute('''
-    SELECT q.question, e.wrong_answer, e.count 
-    FROM error_analysis e
-    JOIN questions q ON e.question_id = q.id
-    ORDER BY e.count DESC LIMIT 5''')
+    SELECT q.question, c.representative, c.count 
+    FROM error_clusters c
+    JOIN questions q ON c.question_id = q.id
+    ORDER BY c.count DESC LIMIT 5''')
     common_errors = cursor.fetchall()
     
-    conn.close()
-    
     # بناء التقرير
     response = f"📊 إحصائيات البوت:\n\n"
     response += f"👥 عدد المستخدمين: {total_users}\n"
@@ -1107,23 +897,23 @@ def show_stats(message):
 
 @bot.message_handler(commands=['admin_stats'], func=lambda m: m.chat.id == ADMIN_CHAT_ID)
 def admin_stats(message):
-    conn = sqlite3.connect('science_bot.db')
+    conn = get_connection()
     cursor = conn.cursor()
     
     # إحصائيات النمو
     cursor.execute('''
-    SELECT date(register_date), COUNT(*) 
-    FROM users 
-    GROUP BY date(register_date) 
-    ORDER BY date(register_date) DESC LIMIT 7''')
+    SELECT day, new_users 
+    FROM stats_daily 
+    WHERE new_users > 0 
+    ORDER BY day DESC LIMIT 7''')
     growth = cursor.fetchall()
     
     # نشاط المستخدمين
     cursor.execute('''
-    SELECT date(last_active), COUNT(*) 
-    FROM users 
-    GROUP BY date(last_active) 
-    ORDER BY date(last_active) DESC LIMIT 7''')
+    SELECT day, active_users 
+    FROM stats_daily 
+    WHERE active_users > 0 
+    ORDER BY day DESC LIMIT 7''')
     activity = cursor.fetchall()
     
     # تقرير مفصل
@@ -1136,12 +926,35 @@ def admin_stats(message):
     for date, count in activity:
         report += f"- {date}: {count} مستخدم نشط\n"
     
-    conn.close()
+    # حالة خيط الكتابة (لمراقبة التشبع)
+    writer_stats = get_writer().stats()
+    report += "\n💾 خيط الكتابة:\n"
+    report += f"- العمليات في الطابور: {writer_stats['queue_depth']}\n"
+    report += f"- زمن الحفظ: آخر {writer_stats['last_commit_ms']:.1f}ms | متوسط {writer_stats['avg_commit_ms']:.1f}ms | أقصى {writer_stats['max_commit_ms']:.1f}ms\n"
+    report += f"- الدفعات: {writer_stats['batches']} | العمليات: {writer_stats['operations']} | الفاشلة: {writer_stats['failures']}\n"
+    
+    # ذاكرة الأسئلة النشطة
+    session_stats = bot.current_questions.stats()
+    report += "\n🗂️ الأسئلة النشطة:\n"
+    report += f"- في الذاكرة: {session_stats['size']} | نسبة الإصابة: {session_stats['hit_rate']:.0%}\n"
+    report += f"- إصابة: {session_stats['hits']} | إخفاق: {session_stats['misses']} (استُعيد من القاعدة {session_stats['restored']})\n"
+    report += f"- مُخرجة: {session_stats['evictions']} | منتهية: {session_stats['expirations']}\n"
+    
     bot.reply_to(message, report)
 
+@bot.message_handler(commands=['reload_questions'], func=lambda m: m.chat.id == ADMIN_CHAT_ID)
+def reload_questions(message):
+    bot.reply_to(message, "⏳ جاري إعادة تحميل بنك الأسئلة...")
+    question_banks.reload_async(
+        on_done=lambda bank: bot.send_message(
+            message.chat.id, f"✅ تم تحميل الإصدار {bank.version} من بنك الأسئلة ({len(bank)} سؤال)"),
+        on_error=lambda e: bot.send_message(
+            message.chat.id, f"⚠️ فشل تحميل بنك الأسئلة: {e}")
+    )
+
 @bot.message_handler(commands=['view_feedback'], func=lambda m: m.chat.id == ADMIN_CHAT_ID)
 def view_feedback(message):
-    conn = sqlite3.connect('science_bot.db')
+    conn = get_connection()
     cursor = conn.cursor()
     
     cursor.execute('''
@@ -1150,7 +963,6 @@ def view_feedback(message):
     ORDER BY created_at DESC LIMIT 10
     ''')
     feedbacks = cursor.fetchall()
-    conn.close()
     
     if not feedbacks:
         bot.reply_to(message, "لا توجد ملاحظات حتى الآن.")
@@ -1164,22 +976,22 @@ def view_feedback(message):
 
 @bot.message_handler(commands=['feedback_stats'], func=lambda m: m.chat.id == ADMIN_CHAT_ID)
 def feedback_stats(message):
-    conn = sqlite3.connect('science_bot.db')
+    conn = get_connection()
     cursor = conn.cursor()
     
-    cursor.execute('SELECT COUNT(*) FROM user_feedback')
+    cursor.execute('''
+    SELECT COUNT(*) FROM user_feedback  -- full-scan: إحصائية للمشرف فقط
+    ''')
     total = cursor.fetchone()[0]
     
     cursor.execute('''
     SELECT strftime('%Y-%m', created_at) AS month, COUNT(*) 
-    FROM user_feedback 
+    FROM user_feedback  -- full-scan: إحصائية للمشرف فقط
     GROUP BY month 
     ORDER BY month DESC LIMIT 6
     ''')
     monthly = cursor.fetchall()
     
-    conn.close()
-    
     response = f"📊 إحصائيات الملاحظات:\n\nإجمالي الملاحظات: {total}\n\n"
     response += "📅 التوزيع الشهري (آخر 6 أشهر):\n"
     for month, count in monthly:
@@ -1190,28 +1002,26 @@ def feedback_stats(message):
 @bot.message_handler(commands=['monthly_stats'])
 @handle_errors
 def monthly_stats(message):
-    conn = sqlite3.connect('science_bot.db')
+    conn = get_connection()
     cursor = conn.cursor()
     chat_id = message.chat.id
 
     cursor.execute('''
-    SELECT strftime('%Y-%m', register_date) AS month, COUNT(*) 
-    FROM users 
-    GROUP BY month
+    SELECT month, new_users 
+    FROM stats_monthly 
+    WHERE new_users > 0
     ORDER BY month DESC LIMIT 6
     ''')
     user_growth = cursor.fetchall()
 
     cursor.execute('''
-    SELECT strftime('%Y-%m', start_time) AS month, SUM(questions_answered)
-    FROM user_sessions
-    GROUP BY month
+    SELECT month, questions_answered
+    FROM stats_monthly
+    WHERE sessions > 0
     ORDER BY month DESC LIMIT 6
     ''')
     questions_answered = cursor.fetchall()
 
-    conn.close()
-
     response = "📅 *إحصائيات شهرية*:\n\n"
     response += "👥 *نمو المستخدمين*\n"
     for month, count in user_growth:
@@ -1226,28 +1036,28 @@ def monthly_stats(message):
 @bot.message_handler(commands=['yearly_stats'])
 @handle_errors
 def yearly_stats(message):
-    conn = sqlite3.connect('science_bot.db')
+    conn = get_connection()
     cursor = conn.cursor()
     chat_id = message.chat.id
 
     cursor.execute('''
-    SELECT strftime('%Y', register_date) AS year, COUNT(*) 
-    FROM users 
+    SELECT substr(month, 1, 4) AS year, SUM(new_users) 
+    FROM stats_monthly 
     GROUP BY year
+    HAVING SUM(new_users) > 0
     ORDER BY year DESC LIMIT 5
     ''')
     user_growth = cursor.fetchall()
 
     cursor.execute('''
-    SELECT strftime('%Y', start_time) AS year, SUM(questions_answered)
-    FROM user_sessions
+    SELECT substr(month, 1, 4) AS year, SUM(questions_answered)
+    FROM stats_monthly
     GROUP BY year
+    HAVING SUM(sessions) > 0
     ORDER BY year DESC LIMIT 5
     ''')
     questions_answered = cursor.fetchall()
 
-    conn.close()
-
     response = "📆 *إحصائيات سنوية*:\n\n"
     response += "👥 *نمو المستخدمين*\n"
     for year, count in user_growth:
@@ -1264,58 +1074,50 @@ def yearly_stats(message):
 @handle_errors
 def handle_text_answer(message):
     chat_id = message.chat.id
-    q_id = bot.current_questions.get(chat_id)
-    if not q_id:
+    current = bot.current_questions.get(chat_id)
+    if not current:
         return  # لا يوجد سؤال نشط
 
-    q = next((q for q in questions if q['id'] == q_id), None)
+    q_id, bank_version = current
+    bank = question_banks.bank_for(bank_version)
+    q = bank.get(q_id)
     if not q:
         bot.send_message(chat_id, "⚠️ حدث خطأ في تحميل السؤال.")
         return
 
+    # النصوص المرجعية موحدة مسبقاً عند تحميل البنك، نوحد إجابة المستخدم فقط
+    normalized = bank.normalized[q_id]
     user_answer = preprocess_arabic(message.text.strip())
     topic = q.get('topic', 'عام')
-    is_correct = False
-    explanation = ""
-    accuracy_percentage = 0
+    kind, is_correct, accuracy_percentage = grade_answer(q, normalized, user_answer)
 
     # تحليل نوع الإجابة
-    if q['type'] == 'mcq':
-        correct_answers = [preprocess_arabic(q['choices'][i]) for i in q.get('correct_indices', [])]
-        is_correct = any(user_answer == preprocess_arabic(ans) for ans in correct_answers)
+    if kind == 'mcq':
         explanation = get_explanation(q)
-        accuracy_percentage = 100 if is_correct else 0
 
-    elif 'answer_keywords' in q:
-        required_keywords = [preprocess_arabic(kw) for kw in q['answer_keywords']]
-        user_answer_processed = preprocess_arabic(user_answer)
-        matched_keywords = [kw for kw in required_keywords if kw in user_answer_processed]
-        accuracy_percentage = (len(matched_keywords) / len(required_keywords)) * 100
-        is_correct = accuracy_percentage >= 70
+    elif kind == 'keywords':
         explanation = f"🔑 *الكلمات المطلوبة:* {', '.join(q['answer_keywords'])}\n\n"
         explanation += f"📊 *نسبة الدقة:* {accuracy_percentage:.1f}%"
 
-    elif 'answer' in q:
-        correct_answer = preprocess_arabic(q['answer'])
-        similarity = SequenceMatcher(None, user_answer, correct_answer).ratio()
-        accuracy_percentage = similarity * 100
-        is_correct = accuracy_percentage > 60
+    elif kind == 'similarity':
         explanation = get_explanation(q)
         explanation += f"\n\n📊 *نسبة التطابق:* {accuracy_percentage:.1f}%"
     
     else:
         explanation = "⚠️ لا توجد إجابة مرجعية لهذا السؤال."
 
-    # تحديث النقاط وتحليل الأخطاء
-    update_user_score(chat_id, is_correct, topic)
-    record_answer_analysis(chat_id, q_id, user_answer, is_correct, accuracy_percentage)
+    # تحديث النقاط وتحليل الأخطاء والأسئلة المجابة في معاملة واحدة
+    recorded = record_answer(chat_id, q_id, topic, is_correct, user_answer, accuracy_percentage,
+                             with_feedback=not is_correct, ordinal=bank.ordinal(q_id))
+    question_sampler.mark_answered(bank, chat_id, q_id)
+    question_selector.record_answer(chat_id, q, is_correct)
 
     # بناء الرسالة النهائية للمستخدم
     if is_correct:
         response = f"✅ *إجابة صحيحة!* ({accuracy_percentage:.1f}%)\n\n{explanation}"
     else:
         correct_answer = q.get('answer_example', q.get('answer', 'لا توجد إجابة'))
-        personalized_feedback = generate_feedback(chat_id, q_id, user_answer)
+        personalized_feedback = generate_feedback(recorded)
         response = (
             f"❌ *إجابة غير صحيحة!* ({accuracy_percentage:.1f}%)\n\n"
             f"📘 *الإجابة النموذجية:* {correct_answer}\n\n"
@@ -1325,19 +1127,8 @@ def handle_text_answer(message):
 
     bot.send_message(chat_id, response, parse_mode="Markdown")
 
-    # عرض الخيارات للمتابعة
-    markup = types.InlineKeyboardMarkup()
-    markup.add(
-        types.InlineKeyboardButton("➡️ سؤال جديد", callback_data="next_question")
-    )
-    bot.send_message(chat_id, "✨ هل تريد محاولة أخرى؟", reply_markup=markup)
-    
-    # بعد التأكد من صحة الإجابة
-    conn = sqlite3.connect('science_bot.db')
-    cursor = conn.cursor()
-    cursor.execute('INSERT OR IGNORE INTO user_answered VALUES (?, ?)', (chat_id, q_id))
-    conn.commit()
-    conn.close()
+    # تقييم السؤال (سهل/صعب) مع زر سؤال جديد
+    show_question_followup(chat_id, q_id)
 
 @bot.message_handler(func=lambda message: True)
 @handle_errors
@@ -1370,11 +1161,12 @@ def handle_unknown_message(message):
 
 # Daily reminder job
 def send_daily_reminders():
-    conn = sqlite3.connect('science_bot.db')
+    conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute('SELECT chat_id FROM users')
+    cursor.execute('''
+    SELECT chat_id FROM users  -- full-scan: التذكير يصل لكل المستخدمين
+    ''')
     users = cursor.fetchall()
-    conn.close()
     
     for user in users:
         try:
@@ -1385,22 +1177,37 @@ def send_daily_reminders():
 # Schedule daily reminder at 6 PM
 scheduler.add_job(send_daily_reminders, 'cron', hour=18)
 
+def send_review_reminders():
+    # المستخدمون الذين لديهم مراجعات مستحقة فقط (قراءة من فهرس وقت الاستحقاق)
+    for chat_id, due in users_with_due_reviews(get_connection()):
+        try:
+            bot.send_message(chat_id, f"🔁 لديك {due} سؤال للمراجعة اليوم. استخدم /review لتثبيت ما تعلمته.")
+        except Exception as e:
+            print(f"Failed to send review reminder to {chat_id}: {e}")
+
+# Schedule review reminders at 5 PM
+scheduler.add_job(send_review_reminders, 'cron', hour=17)
+
+# دمج وأرشفة جداول الأخطاء ليلاً (الساعة 3 صباحاً)
+MistakesCompactor.from_env().start(scheduler)
+
 @app.route('/admin/dashboard')
 def admin_dashboard():
     if not ADMIN_CHAT_ID:
         return "غير مسموح بالوصول", 403
     
-    conn = sqlite3.connect('science_bot.db')
+    conn = get_connection()
     cursor = conn.cursor()
     
     # 1. إجمالي عدد المستخدمين
-    cursor.execute('SELECT COUNT(*) FROM users')
-    total_users = cursor.fetchone()[0]
+    cursor.execute('SELECT users FROM stats_totals')
+    row = cursor.fetchone()
+    total_users = row[0] if row else 0
     
     # 2. المستخدمين النشطين حالياً (خلال آخر 30 دقيقة)
     cursor.execute('''
     SELECT COUNT(*) FROM users 
-    WHERE datetime(last_active) > datetime('now', '-30 minutes')
+    WHERE last_active > strftime('%Y-%m-%dT%H:%M:%S', 'now', '-30 minutes')
     ''')
     active_users = cursor.fetchone()[0]
     
@@ -1412,8 +1219,6 @@ def admin_dashboard():
     ''')
     feedbacks = cursor.fetchall()
     
-    conn.close()
-    
     # HTML template للواجهة
     template = """
     <!DOCTYPE html>
@@ -1539,6 +1344,9 @@ def admin_dashboard():
 
 
 if __name__ == '__main__':
+    # حفظ العدادات المعلقة عند إيقاف الخادم (SIGTERM)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    
     # Start the Flask server in a separate thread
     Thread(target=lambda: app.run(
         host='0.0.0.0',
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+
+"""
+Re-grade stored wrong answers with the current grading engine.
+
+After fixing a keyword list or a threshold, the rows already stored in
+user_mistakes and error_analysis keep their old verdicts. This command
+streams them in id order, grades each chunk in a process pool with the
+same grade_answer used by handle_text_answer, and writes the results back
+one transaction per chunk:
+
+- user_mistakes.accuracy is updated to the new accuracy;
+- with --prune-correct, rows that now grade as correct are deleted from
+  both tables, and the error_analysis ones are taken out of their
+  error_clusters (error_clusters.remove_wrong_answer) in the same
+  transaction.
+
+Memory stays bounded: at most `workers * 2` chunks are in flight.
+
+Usage:
+    python regrade.py [--table all] [--chunk-size 5000] [--workers N] [--prune-correct] [--dry-run]
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from arabic_text import preprocess_arabic
+from db import DATABASE, connect
+from error_clusters import remove_wrong_answer
+from grading import grade_answer
+from question_bank import load_bank
+
+TABLES = ('user_mistakes', 'error_analysis')
+
+_bank = None
+
+
+def _init_worker():
+    global _bank
+    _bank = load_bank()
+
+
+def _grade_chunk(rows, exact):
+    """Grade (row_id, question_id, wrong_answer) rows; returns (row_id, is_correct, accuracy) or None.
+
+    Without `exact` the accuracy of a wrong answer may be an upper bound (only the verdict is used).
+    """
+    results = []
+    for row_id, question_id, wrong_answer in rows:
+        q = _bank.get(question_id)
+        if q is None or wrong_answer is None:
+            results.append((row_id, None, None))
+            continue
+        _, is_correct, accuracy = grade_answer(q, _bank.normalized[question_id], preprocess_arabic(wrong_answer),
+                                               exact=exact)
+        results.append((row_id, is_correct, accuracy))
+    return results
+
+
+def iter_chunks(conn, table, chunk_size):
+    """Keyset pagination by id so no cursor stays open across writes"""
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            f'SELECT id, question_id, wrong_answer FROM {table} WHERE id > ? ORDER BY id LIMIT ?',
+            (last_id, chunk_size)
+        ).fetchall()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield [tuple(row) for row in rows]
+
+
+def write_results(conn, table, results, prune_correct, stats):
+    updates = []
+    deletes = []
+    for row_id, is_correct, accuracy in results:
+        if is_correct is None:
+            stats['skipped'] += 1
+            continue
+        if is_correct:
+            stats['now_correct'] += 1
+            if prune_correct:
+                deletes.append((row_id,))
+                continue
+        if table == 'user_mistakes':
+            updates.append((accuracy, row_id))
+
+    if stats['dry_run']:
+        return
+    with conn:
+        if updates:
+            conn.executemany('UPDATE user_mistakes SET accuracy = ? WHERE id = ?', updates)
+        if table == 'error_analysis':
+            # الإجابات الصحيحة لا تبقى ضمن "الأخطاء الشائعة"
+            for (row_id,) in deletes:
+                removed = conn.execute('''
+                DELETE FROM error_analysis WHERE id = ?
+                RETURNING question_id, wrong_answer, count''', (row_id,)).fetchone()
+                if removed and removed[1]:
+                    remove_wrong_answer(conn, removed[0], removed[1], removed[2] or 1)
+        elif deletes:
+            conn.executemany(f'DELETE FROM {table} WHERE id = ?', deletes)
+    stats['updated'] += len(updates)
+    stats['deleted'] += len(deletes)
+
+
+def regrade_table(conn, pool, table, chunk_size, max_in_flight, prune_correct, dry_run):
+    stats = {'rows': 0, 'skipped': 0, 'now_correct': 0, 'updated': 0, 'deleted': 0, 'dry_run': dry_run}
+    started = time.perf_counter()
+    in_flight = deque()
+
+    def drain_one():
+        results = in_flight.popleft().result()
+        write_results(conn, table, results, prune_correct, stats)
+        stats['rows'] += len(results)
+        elapsed = time.perf_counter() - started
+        print(f"  {table}: {stats['rows']} rows, {stats['rows'] / elapsed:,.0f} rows/s", end='\r')
+
+    for rows in iter_chunks(conn, table, chunk_size):
+        # الدقة تُحفظ في user_mistakes فقط
+        in_flight.append(pool.submit(_grade_chunk, rows, table == 'user_mistakes'))
+        if len(in_flight) >= max_in_flight:
+            drain_one()
+    while in_flight:
+        drain_one()
+
+    elapsed = time.perf_counter() - started
+    rate = stats['rows'] / elapsed if elapsed else 0
+    print(f"✅ {table}: {stats['rows']} rows in {elapsed:.1f}s ({rate:,.0f} rows/s) | "
+          f"now correct {stats['now_correct']} | updated {stats['updated']} | "
+          f"deleted {stats['deleted']} | skipped {stats['skipped']}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=DATABASE)
+    parser.add_argument('--table', choices=TABLES + ('all',), default='all')
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--prune-correct', action='store_true',
+                        help='delete rows that now grade as correct')
+    parser.add_argument('--dry-run', action='store_true', help='grade and report without writing')
+    args = parser.parse_args()
+
+    tables = TABLES if args.table == 'all' else (args.table,)
+    conn = connect(args.db)
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker) as pool:
+            for table in tables:
+                regrade_table(conn, pool, table, args.chunk_size, args.workers * 2,
+                              args.prune_correct, args.dry_run)
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
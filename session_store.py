@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+
+"""
+Active question sessions
+السؤال النشط لكل مستخدم: ذاكرة محدودة الحجم (LRU) بمدة صلاحية، محفوظة في SQLite
+
+Replaces the old unbounded `bot.current_questions` dict. Each chat has one
+compact entry (question_id, bank_version, expires_at) kept in an LRU of
+at most `max_entries` chats and written through to active_questions
+(migration 12) on the writer thread, so the active question survives a
+restart and other worker processes can read it.
+
+A miss in memory reads the row back from SQLite (one primary key lookup;
+`restored` counts the misses found there).
+With `shared=True` (SESSION_SHARED=1, several processes serving the same
+bot) every `get` reads SQLite, because another process may have sent the
+chat a newer question. Expired rows are deleted by `purge_expired`, which
+runs on the scheduler.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from db import DATABASE, get_connection
+from db_writer import get_writer
+
+# مدة صلاحية السؤال النشط (ثانية)
+SESSION_TTL = 24 * 60 * 60
+MAX_SESSIONS = 10000
+
+
+class SessionStore:
+    def __init__(self, path=DATABASE, max_entries=MAX_SESSIONS, ttl=SESSION_TTL, shared=False):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared = shared
+        self._entries = OrderedDict()
+        # كتابات لم تُحفظ بعد لكل محادثة (حتى لا تقرأ القراءة من SQLite قيمة أقدم)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.restored = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @classmethod
+    def from_env(cls, path=DATABASE):
+        return cls(
+            path,
+            max_entries=int(os.getenv('SESSION_MAX_ENTRIES', MAX_SESSIONS)),
+            ttl=int(os.getenv('SESSION_TTL', SESSION_TTL)),
+            shared=os.getenv('SESSION_SHARED', '0').lower() in ('1', 'true', 'yes'),
+        )
+
+    def start(self, scheduler, interval=3600):
+        scheduler.add_job(self.purge_expired, 'interval', seconds=interval)
+
+    def get(self, chat_id):
+        """(question_id, bank_version) of the chat's active question, or None"""
+        now = time.time()
+        if not self.shared:
+            with self._lock:
+                entry = self._entries.get(chat_id)
+                if entry is not None:
+                    if entry[2] > now:
+                        self._entries.move_to_end(chat_id)
+                        self.hits += 1
+                        return entry[0], entry[1]
+                    del self._entries[chat_id]
+                    self.expirations += 1
+
+        pending = self._pending.get(chat_id)
+        if pending is not None:
+            pending.result()
+
+        row = get_connection(self.path).execute('''
+        SELECT question_id, bank_version, expires_at FROM active_questions
+        WHERE chat_id = ?''', (chat_id,)).fetchone()
+        with self._lock:
+            self.misses += 1
+            if row is None or row[2] <= now:
+                self._entries.pop(chat_id, None)
+                return None
+            self.restored += 1
+            self._put(chat_id, tuple(row))
+        return row[0], row[1]
+
+    def set(self, chat_id, question_id, bank_version):
+        entry = (question_id, bank_version, int(time.time() + self.ttl))
+        with self._lock:
+            self._put(chat_id, entry)
+        # لا حاجة لانتظار الحفظ: القراءة التالية في هذه العملية من الذاكرة
+        self._write(chat_id, '''
+        INSERT INTO active_questions (chat_id, question_id, bank_version, expires_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(chat_id) DO UPDATE SET
+            question_id = excluded.question_id,
+            bank_version = excluded.bank_version,
+            expires_at = excluded.expires_at''', (chat_id,) + entry)
+
+    def discard(self, chat_id):
+        with self._lock:
+            self._entries.pop(chat_id, None)
+        self._write(chat_id, 'DELETE FROM active_questions WHERE chat_id = ?', (chat_id,))
+
+    def _write(self, chat_id, sql, params):
+        future = get_writer(self.path).execute(sql, params)
+        self._pending[chat_id] = future
+        future.add_done_callback(lambda done: self._written(chat_id, done))
+
+    def _written(self, chat_id, future):
+        if self._pending.get(chat_id) is future:
+            self._pending.pop(chat_id, None)
+
+    def _put(self, chat_id, entry):
+        self._entries[chat_id] = entry
+        self._entries.move_to_end(chat_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def purge_expired(self):
+        """Drop expired entries from memory and SQLite; returns the number of rows deleted"""
+        now = time.time()
+        with self._lock:
+            expired = [chat_id for chat_id, entry in self._entries.items() if entry[2] <= now]
+            for chat_id in expired:
+                del self._entries[chat_id]
+            self.expirations += len(expired)
+        return get_writer(self.path).call(
+            lambda conn: conn.execute('DELETE FROM active_questions WHERE expires_at <= ?', (int(now),)).rowcount
+        )
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'restored': self.restored,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
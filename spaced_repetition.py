@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+"""
+Spaced repetition
+جدولة مراجعة الأسئلة التي أخطأ فيها المستخدم أو قيّمها صعبة (خوارزمية SM-2)
+
+review_schedule (migration 11) keeps one small row per (chat_id,
+question_id): the next due time (unix seconds), the SM-2 interval in days,
+the ease factor (x100) and the number of successful repetitions in a row.
+
+- A wrong answer or a "hard" rating puts the question in the schedule
+  (due after one day); answers to scheduled questions move it along the
+  SM-2 intervals (1, 6, interval * ease days). Once the interval exceeds
+  MASTERED_DAYS the row is deleted.
+- idx_review_schedule_user (chat_id, due) finds a user's due reviews with
+  one range read; idx_review_schedule_due (due, chat_id) finds every user
+  with due reviews for the reminder without touching the rest.
+"""
+
+import time
+
+DAY = 24 * 60 * 60
+START_EASE = 250
+MIN_EASE = 130
+# السؤال يخرج من المراجعة عندما تتجاوز الفترة هذا العدد من الأيام
+MASTERED_DAYS = 90
+
+
+def review_quality(is_correct, accuracy=0):
+    """SM-2 grade 0..5 from an answer (below 3 restarts the intervals)"""
+    if is_correct:
+        return 5 if accuracy >= 90 else 4
+    return 2 if accuracy >= 50 else 1
+
+
+def sm2(quality, repetitions, interval, ease):
+    """Next (repetitions, interval in days, ease x100) after an answer graded `quality`"""
+    if quality < 3:
+        repetitions, interval = 0, 1
+    else:
+        if repetitions == 0:
+            interval = 1
+        elif repetitions == 1:
+            interval = 6
+        else:
+            interval = round(interval * ease / 100)
+        repetitions += 1
+    ease = max(MIN_EASE, ease + round(100 * (0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))))
+    return repetitions, interval, ease
+
+
+def update_review(conn, chat_id, question_id, quality, now=None):
+    """Apply one answer to the schedule (caller's transaction).
+
+    A question that is not scheduled enters the schedule only on a failed
+    answer (quality < 3).
+    """
+    now = int(now or time.time())
+    row = conn.execute('''
+    SELECT repetitions, interval, ease FROM review_schedule
+    WHERE chat_id = ? AND question_id = ?''', (chat_id, question_id)).fetchone()
+    if row is None:
+        if quality >= 3:
+            return
+        repetitions, interval, ease = sm2(quality, 0, 0, START_EASE)
+    else:
+        repetitions, interval, ease = sm2(quality, *row)
+        if interval > MASTERED_DAYS:
+            conn.execute('DELETE FROM review_schedule WHERE chat_id = ? AND question_id = ?',
+                         (chat_id, question_id))
+            return
+
+    conn.execute('''
+    INSERT INTO review_schedule (chat_id, question_id, due, interval, ease, repetitions)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(chat_id, question_id) DO UPDATE SET
+        due = excluded.due, interval = excluded.interval,
+        ease = excluded.ease, repetitions = excluded.repetitions''',
+    (chat_id, question_id, now + interval * DAY, interval, ease, repetitions))
+
+
+def schedule_hard(conn, chat_id, question_id, now=None):
+    """A "hard" rating: review again after one day, whatever the schedule was"""
+    now = int(now or time.time())
+    conn.execute('''
+    INSERT INTO review_schedule (chat_id, question_id, due, interval, ease, repetitions)
+    VALUES (?, ?, ?, 1, ?, 0)
+    ON CONFLICT(chat_id, question_id) DO UPDATE SET
+        due = excluded.due, interval = 1, repetitions = 0, ease = MAX(?, ease - 20)''',
+    (chat_id, question_id, now + DAY, START_EASE, MIN_EASE))
+
+
+def due_reviews(conn, chat_id, now=None, limit=5):
+    """Question ids due for `chat_id`, most overdue first"""
+    return [q_id for (q_id,) in conn.execute('''
+    SELECT question_id FROM review_schedule
+    WHERE chat_id = ? AND due <= ?
+    ORDER BY due LIMIT ?''', (chat_id, int(now or time.time()), limit)).fetchall()]
+
+
+def users_with_due_reviews(conn, now=None):
+    """[(chat_id, number of due reviews)] for the reminder"""
+    # بدون INDEXED BY يفضّل المخطط مسح (chat_id, due) كاملاً بسبب GROUP BY
+    return conn.execute('''
+    SELECT chat_id, COUNT(*) FROM review_schedule INDEXED BY idx_review_schedule_due
+    WHERE due <= ?
+    GROUP BY chat_id''', (int(now or time.time()),)).fetchall()
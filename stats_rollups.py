@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+"""
+Statistics rollups
+جداول إحصائيات مجمّعة (يومية، شهرية، بالساعة) تحدّثها القوادح (triggers) مع كل كتابة
+
+The tables and triggers are created by migration 5 (migrations.py):
+
+- stats_daily / stats_monthly: new_users, active_users, sessions,
+  finished_sessions, session_minutes, questions_answered per day / month;
+- stats_hourly: sessions and questions_answered per hour of the day;
+- stats_topics: how many users have each topic selected;
+- stats_totals: one row with the number of users and the sum of their
+  score and attempts.
+
+active_users counts a user once per day (and month) the first time they
+are active in it. Rows are never decremented when raw rows are deleted,
+so the history survives pruning of users/user_sessions.
+
+`backfill` rebuilds everything from the raw tables. The raw tables keep
+only each user's last activity, so a rebuilt active_users counts every
+user on their last active day only.
+
+Usage:
+    python stats_rollups.py --backfill [--db science_bot.db]
+"""
+
+import argparse
+import sys
+
+from db import DATABASE, connect
+
+ROLLUP_TABLES = ('stats_daily', 'stats_monthly', 'stats_hourly', 'stats_topics', 'stats_totals')
+
+# (الجدول، المفتاح، تعبير المفتاح من عمود التاريخ)
+PERIODS = (
+    ('stats_daily', 'day', "date({})"),
+    ('stats_monthly', 'month', "strftime('%Y-%m', {})"),
+)
+
+_SESSION_MINUTES = '(julianday(end_time) - julianday(start_time)) * 24 * 60'
+
+
+def _add(conn, table, key, column, select):
+    """Add the (k, v) rows of `select` to `column` of `table`"""
+    conn.execute(f'''
+    INSERT INTO {table} ({key}, {column})
+    SELECT k, v FROM ({select}) WHERE k IS NOT NULL
+    ON CONFLICT({key}) DO UPDATE SET {column} = {column} + excluded.{column}''')
+
+
+def backfill(conn):
+    """Rebuild all rollup tables from users and user_sessions (caller owns the transaction)"""
+    for table in ROLLUP_TABLES:
+        conn.execute(f'DELETE FROM {table}')
+
+    for table, key, period in PERIODS:
+        register, active, start = (period.format(col) for col in ('register_date', 'last_active', 'start_time'))
+        _add(conn, table, key, 'new_users', f'SELECT {register} AS k, COUNT(*) AS v FROM users GROUP BY k')
+        _add(conn, table, key, 'active_users', f'SELECT {active} AS k, COUNT(*) AS v FROM users GROUP BY k')
+        _add(conn, table, key, 'sessions', f'SELECT {start} AS k, COUNT(*) AS v FROM user_sessions GROUP BY k')
+        _add(conn, table, key, 'questions_answered',
+             f'SELECT {start} AS k, SUM(COALESCE(questions_answered, 0)) AS v FROM user_sessions GROUP BY k')
+        _add(conn, table, key, 'finished_sessions',
+             f'SELECT {start} AS k, COUNT(*) AS v FROM user_sessions WHERE end_time IS NOT NULL GROUP BY k')
+        _add(conn, table, key, 'session_minutes',
+             f'SELECT {start} AS k, SUM({_SESSION_MINUTES}) AS v FROM user_sessions '
+             f'WHERE end_time IS NOT NULL GROUP BY k')
+
+    hour = "strftime('%H', start_time)"
+    _add(conn, 'stats_hourly', 'hour', 'sessions', f'SELECT {hour} AS k, COUNT(*) AS v FROM user_sessions GROUP BY k')
+    _add(conn, 'stats_hourly', 'hour', 'questions_answered',
+         f'SELECT {hour} AS k, SUM(COALESCE(questions_answered, 0)) AS v FROM user_sessions GROUP BY k')
+
+    _add(conn, 'stats_topics', 'topic', 'users',
+         'SELECT selected_topic AS k, COUNT(*) AS v FROM users GROUP BY k')
+
+    conn.execute('''
+    INSERT INTO stats_totals (id, users, score, attempts)
+    SELECT 1, COUNT(*), COALESCE(SUM(score), 0), COALESCE(SUM(attempts), 0) FROM users''')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=DATABASE)
+    parser.add_argument('--backfill', action='store_true', help='rebuild the rollups from the raw tables')
+    args = parser.parse_args()
+
+    if not args.backfill:
+        parser.print_help()
+        return 0
+
+    conn = connect(args.db)
+    try:
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            backfill(conn)
+        totals = conn.execute('SELECT users, attempts FROM stats_totals').fetchone()
+        days = conn.execute('SELECT COUNT(*) FROM stats_daily').fetchone()[0]
+        print(f"✅ Rollups rebuilt: {totals[0]} users, {totals[1]} attempts, {days} days")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from db import connect  # noqa: E402
+from migrations import migrate  # noqa: E402
+
+
+@pytest.fixture
+def database(tmp_path):
+    """Path of an empty database migrated to the latest schema"""
+    path = str(tmp_path / 'bot.db')
+    conn = connect(path)
+    try:
+        migrate(conn)
+    finally:
+        conn.close()
+    return path
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+
+from answered_bits import clear_answered, load_answered_bits, mark_answered
+from db import connect
+
+CHAT_ID = 123456789
+
+
+def test_clearing_a_user_decrements_answered_users(database):
+    conn = connect(database)
+    try:
+        with conn:
+            conn.executemany('''
+            INSERT INTO questions (id, question, type, ordinal) VALUES (?, 'سؤال', 'text', ?)''',
+            [('q_001', 0), ('q_002', 9), ('q_003', 17)])
+            mark_answered(conn, CHAT_ID, 'q_001', 0)
+            mark_answered(conn, CHAT_ID, 'q_003', 17)
+            mark_answered(conn, CHAT_ID + 1, 'q_003', 17)
+        with conn:
+            clear_answered(conn, CHAT_ID)
+
+        counts = dict(conn.execute('SELECT id, answered_users FROM questions').fetchall())
+        assert counts == {'q_001': 0, 'q_002': 0, 'q_003': 1}
+        assert load_answered_bits(conn, CHAT_ID) == b''
+    finally:
+        conn.close()
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+from answers import _record_answer, _record_question_rating
+from db import connect
+from db_writer import get_writer
+
+CHAT_ID = 123456789
+
+
+def _review_rows(database):
+    conn = connect(database)
+    try:
+        return conn.execute('SELECT question_id, interval, repetitions FROM review_schedule').fetchall()
+    finally:
+        conn.close()
+
+
+def test_hard_rating_schedules_a_review(database):
+    # rate_hard_<id>: المعرف نفسه يحتوي على _
+    _, rating, q_id = 'rate_hard_new_q_004'.split('_', 2)
+    get_writer(database).call(_record_question_rating, CHAT_ID, q_id, rating)
+    assert [tuple(row) for row in _review_rows(database)] == [('new_q_004', 1, 0)]
+
+
+def test_easy_rating_schedules_nothing(database):
+    get_writer(database).call(_record_question_rating, CHAT_ID, 'q_001', 'easy')
+    assert _review_rows(database) == []
+
+
+def test_repeated_wrong_answer_updates_its_cluster(database):
+    writer = get_writer(database)
+    conn = connect(database)
+    try:
+        with conn:
+            conn.execute('''
+            INSERT INTO users (chat_id, register_date, last_active) VALUES (?, '2026-01-01', '2026-01-01')''',
+            (CHAT_ID,))
+        for _ in range(2):
+            writer.call(_record_answer, CHAT_ID, 'q_001', 'عام', 0, '2026-01-01', 'التنفس', 10,
+                        False, None)
+        rows = conn.execute('SELECT representative, representative_count, count FROM error_clusters').fetchall()
+        assert [tuple(row) for row in rows] == [('التنفس', 2, 2)]
+    finally:
+        conn.close()
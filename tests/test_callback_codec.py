@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+from callback_codec import MAX_CALLBACK_BYTES, CallbackCodec, claim_tap, purge_taps
+from db_writer import get_writer
+
+CHAT_ID = 123456789
+NOW = 1_700_000_000
+
+
+def test_round_trip_carries_the_issue_time():
+    codec = CallbackCodec(b'secret')
+    data = codec.encode(CHAT_ID, 42, 3, 1, issued=NOW)
+    assert len(data.encode('utf-8')) <= MAX_CALLBACK_BYTES
+    assert codec.decode(CHAT_ID, data, now=NOW + 5) == (42, 3, NOW, 1)
+
+
+def test_forged_or_foreign_or_expired_data_is_rejected():
+    codec = CallbackCodec(b'secret', ttl=3600)
+    data = codec.encode(CHAT_ID, 42, 3, 1, issued=NOW)
+    assert codec.decode(CHAT_ID + 1, data, now=NOW) is None
+    assert codec.decode(CHAT_ID, data.replace(':1:', ':2:'), now=NOW) is None
+    assert codec.decode(CHAT_ID, data, now=NOW + 3600) is None
+    assert CallbackCodec(b'other').decode(CHAT_ID, data, now=NOW) is None
+
+
+def test_replayed_callback_is_graded_once(database):
+    codec = CallbackCodec(b'secret')
+    data = codec.encode(CHAT_ID, 42, 3, 1, issued=NOW)
+    writer = get_writer(database)
+
+    claims = []
+    for _ in range(2):
+        ordinal, _version, issued, _choice = codec.decode(CHAT_ID, data, now=NOW + 10)
+        claims.append(writer.call(claim_tap, CHAT_ID, ordinal, issued))
+    assert claims == [True, False]
+
+    # السؤال نفسه مرسلاً من جديد يُصحَّح مرة أخرى
+    assert writer.call(claim_tap, CHAT_ID, 42, NOW + 60)
+
+
+def test_purge_keeps_taps_that_are_still_valid(database):
+    writer = get_writer(database)
+    writer.call(claim_tap, CHAT_ID, 1, NOW - 7200)
+    writer.call(claim_tap, CHAT_ID, 2, NOW - 60)
+    assert writer.call(purge_taps, 3600, NOW) == 1
+    assert not writer.call(claim_tap, CHAT_ID, 2, NOW - 60)
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+
+from arabic_text import answer_bucket
+from compaction import MistakesCompactor
+from db import connect
+
+OLD = '2000-01-01 00:00:00'
+
+
+def test_folding_keeps_a_readable_answer(tmp_path, database):
+    conn = connect(database)
+    with conn:
+        conn.executemany('''
+        INSERT INTO error_analysis (question_id, wrong_answer, count, last_seen) VALUES ('q1', ?, 1, ?)''',
+        [('الخلية النباتية', OLD), ('الخليه  النباتيه', OLD), ('الخلية النباتية.', OLD)])
+    conn.close()
+
+    compactor = MistakesCompactor(database, archive_dir=str(tmp_path / 'archive'),
+                                  archive_after_days=100000, pause=0)
+    assert compactor.run()['error_analysis'] == (2, 0)
+
+    conn = connect(database)
+    rows = conn.execute('SELECT wrong_answer, answer_key, count FROM error_analysis').fetchall()
+    conn.close()
+    assert [tuple(row) for row in rows] == [('الخلية النباتية', answer_bucket('الخلية النباتية'), 3)]
+    assert list((tmp_path / 'archive').iterdir())
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+import json
+
+import question_bank
+from compile_bank import build_bank
+from db import connect
+from question_bank import load_bank, load_questions, write_artifact
+from question_sync import load_ordinals, sync_questions
+
+
+def _question(q_id):
+    return {'id': q_id, 'question': f"سؤال {q_id}", 'type': 'text', 'answer': 'جواب', 'topic': 'عام'}
+
+
+def _write_sources(tmp_path, ids):
+    path = tmp_path / 'questions.json'
+    path.write_text(json.dumps([_question(q_id) for q_id in ids], ensure_ascii=False), encoding='utf-8')
+    return ((str(path), ''),)
+
+
+def _sync(database, bank):
+    conn = connect(database)
+    try:
+        with conn:
+            sync_questions(conn, bank)
+    finally:
+        conn.close()
+
+
+def _ordinals(database):
+    conn = connect(database)
+    try:
+        return load_ordinals(conn)
+    finally:
+        conn.close()
+
+
+def test_recompiled_artifact_is_used_after_a_question_is_removed(tmp_path, database, monkeypatch):
+    artifact = str(tmp_path / 'questions.bank')
+    sources = _write_sources(tmp_path, ['q1', 'q2', 'q3'])
+    bank = build_bank(load_questions(sources), database)
+    write_artifact(bank, artifact, sources)
+    _sync(database, bank)
+
+    sources = _write_sources(tmp_path, ['q1', 'q3', 'q4'])
+    write_artifact(build_bank(load_questions(sources), database), artifact, sources)
+    ordinals, next_ordinal = _ordinals(database)
+
+    def no_json(*args, **kwargs):
+        raise AssertionError('fell back to the JSON files')
+
+    monkeypatch.setattr(question_bank, 'load_questions', no_json)
+    loaded = load_bank(sources, artifact, ordinals=ordinals, next_ordinal=next_ordinal)
+
+    assert loaded.ordinal('q1') == ordinals['q1']
+    assert loaded.ordinal('q3') == ordinals['q3']
+    # ترتيب السؤال المحذوف لا يُعاد استخدامه
+    assert loaded.ordinal('q4') == next_ordinal
+    assert loaded.at(ordinals['q2']) is None
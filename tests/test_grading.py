@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+
+from grading import SIMILARITY_THRESHOLD, LcsSimilarity, grade_answer
+
+QUESTION = {'type': 'text', 'answer': 'البناء الضوئي'}
+NORMALIZED = {'answer': 'البناء الضوئي'}
+
+
+def test_rejected_answer_reports_the_exact_accuracy():
+    engine = LcsSimilarity()
+    answer = 'البناء' + ' ' * 40
+    exact = engine.score(answer, NORMALIZED['answer']) * 100
+    bound = engine.score(answer, NORMALIZED['answer'], SIMILARITY_THRESHOLD / 100) * 100
+    assert exact < bound < SIMILARITY_THRESHOLD
+
+    assert grade_answer(QUESTION, NORMALIZED, answer, engine) == ('similarity', False, exact)
+    assert grade_answer(QUESTION, NORMALIZED, answer, engine, exact=False) == ('similarity', False, bound)
+
+
+def test_accepted_answer_is_exact_either_way():
+    engine = LcsSimilarity()
+    answer = 'البناء الضوئ'
+    exact = engine.score(answer, NORMALIZED['answer']) * 100
+    assert grade_answer(QUESTION, NORMALIZED, answer, engine, exact=False) == ('similarity', True, exact)
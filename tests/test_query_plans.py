@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+
+from check_query_plans import DEFAULT_FILES, FULL_SCAN_MARKER, _PLANNED, collect_queries, full_scans
+from db import connect
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize('module', DEFAULT_FILES)
+def test_queries_do_not_scan_whole_tables(database, module):
+    queries, _ = collect_queries(os.path.join(ROOT, module))
+    assert queries
+
+    conn = connect(database)
+    try:
+        failures = []
+        for line, sql in queries:
+            if not sql.lstrip().upper().startswith(_PLANNED) or FULL_SCAN_MARKER in sql:
+                continue
+            tables, _ = full_scans(conn, sql)
+            if tables:
+                failures.append(f"{module}:{line}: full scan of {', '.join(tables)}")
+    finally:
+        conn.close()
+    assert failures == []
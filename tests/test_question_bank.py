@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+from question_bank import QUESTION_SOURCES, QuestionBank, load_questions, read_artifact, write_artifact
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCES = tuple((os.path.join(ROOT, path), prefix) for path, prefix in QUESTION_SOURCES)
+
+
+def test_artifact_round_trip_matches_the_json_bank(tmp_path):
+    artifact = str(tmp_path / 'questions.bank')
+    bank = QuestionBank(load_questions(SOURCES))
+    write_artifact(bank, artifact, SOURCES)
+    loaded = QuestionBank.from_state(read_artifact(artifact, SOURCES))
+
+    assert loaded.ordinals == bank.ordinals
+    assert loaded.by_subject_topic == bank.by_subject_topic
+    for q in bank.questions:
+        expected, actual = bank.normalized[q['id']], loaded.normalized[q['id']]
+        assert actual['answer'] == expected['answer']
+        if expected['keyword_matcher']:
+            text = ' '.join(expected['keywords'][::2])
+            assert actual['keyword_matcher'].find(text) == expected['keyword_matcher'].find(text)
+
+
+def test_corrupt_artifact_is_not_loaded(tmp_path):
+    artifact = tmp_path / 'questions.bank'
+    write_artifact(QuestionBank(load_questions(SOURCES)), str(artifact), SOURCES)
+    data = bytearray(artifact.read_bytes())
+    data[-1] ^= 0xFF
+    artifact.write_bytes(bytes(data))
+    assert read_artifact(str(artifact), SOURCES) is None
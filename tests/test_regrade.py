@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+from db import connect
+from error_clusters import add_wrong_answer
+from regrade import write_results
+
+
+def _stats():
+    return {'rows': 0, 'skipped': 0, 'now_correct': 0, 'updated': 0, 'deleted': 0, 'dry_run': False}
+
+
+def _add(conn, answer, count):
+    row_id = conn.execute('''
+    INSERT INTO error_analysis (question_id, wrong_answer, count) VALUES ('q1', ?, ?)''',
+    (answer, count)).lastrowid
+    add_wrong_answer(conn, 'q1', answer, count, count)
+    return row_id
+
+
+def test_pruned_answers_leave_their_clusters(database):
+    conn = connect(database)
+    try:
+        with conn:
+            representative = _add(conn, 'البناء الضوئي', 3)
+            _add(conn, 'البناء الضوءي', 1)
+            lone = _add(conn, 'التنفس', 2)
+
+        write_results(conn, 'error_analysis', [(representative, True, 100), (lone, True, 100)], True, _stats())
+
+        clusters = conn.execute('SELECT representative, count FROM error_clusters').fetchall()
+        assert [tuple(row) for row in clusters] == [('البناء الضوءي', 1)]
+    finally:
+        conn.close()
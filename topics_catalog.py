@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+"""
+Topics catalog
+تحميل topics_info.json مرة واحدة مع فهرس عكسي من الموضوع إلى المادة
+"""
+
+import json
+import os
+
+
+class _CatalogSnapshot:
+    """Immutable view of topics_info.json at a given mtime"""
+
+    __slots__ = ('mtime', 'subjects', 'topic_index')
+
+    def __init__(self, mtime, subjects):
+        self.mtime = mtime
+        self.subjects = subjects
+        self.topic_index = {}
+        for subject, subject_data in subjects.items():
+            for topic_name, topic_info in subject_data.get('topics', {}).items():
+                # أول مادة تحتوي الموضوع هي المعتمدة (كما في البحث السابق)
+                self.topic_index.setdefault(topic_name, (subject, topic_info))
+
+
+class TopicsCatalog:
+    """Serves subjects/topics from memory; reloads when the file's mtime changes.
+
+    Handlers only read `self._snapshot`, which is replaced in a single
+    assignment, so a reload never exposes a half-built catalog.
+    """
+
+    def __init__(self, path='topics_info.json'):
+        self.path = path
+        self._snapshot = self._load()
+
+    def _load(self):
+        mtime = os.stat(self.path).st_mtime_ns
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return _CatalogSnapshot(mtime, data['subjects'])
+
+    def refresh_if_changed(self):
+        """Reload the catalog if the file changed on disk. Returns True on reload."""
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+            if mtime == self._snapshot.mtime:
+                return False
+            self._snapshot = self._load()
+        except (OSError, ValueError, KeyError) as e:
+            # نحتفظ بالنسخة السابقة إذا كان الملف غير صالح
+            print(f"فشل تحديث ملف المواضيع: {e}")
+            return False
+        print("🔄 تم تحديث قائمة المواضيع")
+        return True
+
+    @property
+    def subjects(self):
+        return self._snapshot.subjects
+
+    def subject_topics(self, subject):
+        """Return the topics dict of a subject, or None if the subject is unknown"""
+        subject_data = self._snapshot.subjects.get(subject)
+        return subject_data.get('topics', {}) if subject_data is not None else None
+
+    def find_topic(self, topic_name):
+        """Return (subject, topic_info) for a topic, or (None, None)"""
+        return self._snapshot.topic_index.get(topic_name, (None, None))